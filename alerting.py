@@ -0,0 +1,258 @@
+# Alert delivery off the frame loop: deduplication, cooldown and burst coalescing
+# in a background thread fed by a bounded queue, and batched delivery to the Node
+# backend with an on-disk spool for outages.
+import json
+import os
+import queue
+import threading
+import time
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts through `deliver(alert)` on a background thread.
+
+    `submit` never blocks: when the queue is full the alert is dropped and counted.
+    Alerts are keyed on (camera_id, track_id, type). Alerts of one key that arrive within
+    `coalesce_seconds` of each other become a single delivery carrying a 'count'; after a
+    delivery the key is muted for `cooldown_seconds` (config.yaml `alert_cooldown_seconds`).
+    """
+    def __init__(self, deliver, cooldown_seconds=30, coalesce_seconds=1.0, max_queue=256, name="alerts"):
+        self.deliver = deliver
+        self.cooldown_seconds = cooldown_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.last_sent = {} # key -> time of the last delivery
+        self.stopped = threading.Event()
+
+        self.submitted = 0
+        self.delivered = 0
+        self.suppressed = 0 # Muted by the cooldown or merged into another delivery
+        self.dropped = 0 # Queue full
+        self.failed = 0
+
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def key(alert):
+        return (alert.get('camera_id'), alert.get('track_id'), alert.get('type', alert.get('message')))
+
+    def submit(self, alert):
+        """Queues an alert; returns False if it had to be dropped."""
+        self.submitted += 1
+        try:
+            self.queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _collect(self):
+        """Waits for an alert, then gathers everything arriving within the coalesce window."""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self.stopped.is_set() and self.queue.empty()):
+            batch = self._collect()
+            if not batch:
+                continue
+            now = time.monotonic()
+
+            # Coalesce by key, keeping the latest alert of each burst
+            groups = {}
+            for alert in batch:
+                key = self.key(alert)
+                if key in groups:
+                    groups[key][1] += 1
+                    groups[key][0] = alert
+                else:
+                    groups[key] = [alert, 1]
+
+            for key, (alert, count) in groups.items():
+                if now - self.last_sent.get(key, -float('inf')) < self.cooldown_seconds:
+                    self.suppressed += count
+                    continue
+                self.suppressed += count - 1
+                self.last_sent[key] = now
+                try:
+                    self.deliver(dict(alert, count=count))
+                    self.delivered += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Error delivering alert {key}: {e}")
+
+            # Forget keys whose cooldown is over
+            if len(self.last_sent) > 1024:
+                self.last_sent = {k: t for k, t in self.last_sent.items() if now - t < self.cooldown_seconds}
+
+    def stop(self, timeout=5):
+        """Delivers what is still queued (within `timeout`) and stops the thread."""
+        self.stopped.set()
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {'submitted': self.submitted, 'delivered': self.delivered, 'suppressed': self.suppressed,
+                'dropped': self.dropped, 'failed': self.failed, 'queued': self.queue.qsize()}
+
+
+class AlertBatchClient:
+    """
+    Sends alerts to the backend (backend/index.js) over Socket.IO in batches: one
+    'send_alert_batch' message every `interval_ms`, acknowledged by the server.
+
+    Every alert gets a sequence number (persisted next to the spool, so it keeps growing
+    across restarts); the server ignores sequence numbers it has already stored, so a
+    batch that is sent again after a lost acknowledgement is not duplicated.
+    When the server is unreachable or does not acknowledge, the batch is appended to
+    `spool_path` (JSON lines) and replayed, oldest first, once the connection is back.
+    `send` only appends to an in-memory list, so the producer never blocks.
+    With `url` the client connects `sio` itself, from its thread, and keeps retrying with
+    exponential backoff (up to `max_reconnect_delay` seconds) whenever it is not connected,
+    so a server that is down at startup is picked up, and the spool replayed, once it is up.
+    """
+    def __init__(self, sio, client_id, spool_path="alert_spool.jsonl", interval_ms=500, max_batch=200,
+                 ack_timeout=5, url=None, max_reconnect_delay=60):
+        self.sio = sio
+        self.client_id = client_id
+        self.url = url
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnect_delay = 1.0 # Seconds to wait after the next failed attempt
+        self.next_connect = 0.0 # time.monotonic() of the next connection attempt
+        self.spool_path = spool_path
+        self.seq_path = spool_path + ".seq"
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.seq = 0
+        if os.path.exists(self.seq_path):
+            with open(self.seq_path) as f:
+                self.seq = int(f.read().strip() or 0)
+        self.replay_offset = 0 # Bytes of the spool already delivered
+
+        self.sent = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="alert-batches", daemon=True)
+        self.thread.start()
+
+    def send(self, alert):
+        """Queues an alert for the next batch; never blocks on the network."""
+        with self.lock:
+            self.seq += 1
+            self.pending.append(dict(alert, seq=self.seq))
+
+    def _connect(self):
+        """Connects to `url` if not connected and the backoff delay has passed; returns whether connected."""
+        if self.sio.connected or self.url is None:
+            return self.sio.connected
+        now = time.monotonic()
+        if now < self.next_connect:
+            return False
+        try:
+            self.sio.connect(self.url)
+            self.reconnect_delay = 1.0
+        except Exception as e:
+            print(f"Alert server {self.url} unreachable ({e}). Retrying in {self.reconnect_delay:.0f} seconds.")
+            self.next_connect = now + self.reconnect_delay
+            self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
+        return self.sio.connected
+
+    def _emit(self, alerts):
+        """Sends one batch and waits for the server's acknowledgement; False if it did not arrive."""
+        if not self.sio.connected:
+            return False
+        batch = {'client_id': self.client_id, 'first_seq': alerts[0]['seq'], 'last_seq': alerts[-1]['seq'],
+                 'alerts': alerts}
+        try:
+            ack = self.sio.call('send_alert_batch', batch, timeout=self.ack_timeout)
+        except Exception as e: # Timeout or disconnect while waiting
+            print(f"Alert batch {batch['first_seq']}-{batch['last_seq']} not acknowledged: {e}")
+            return False
+        return bool(ack) and ack.get('last_seq', 0) >= batch['last_seq']
+
+    def _spool(self, alerts):
+        with open(self.spool_path, 'a') as f:
+            f.writelines(json.dumps(alert) + "\n" for alert in alerts)
+        self.spooled += len(alerts)
+
+    def _replay(self):
+        """Sends spooled alerts, oldest first; the spool is truncated once all are acknowledged."""
+        if not os.path.exists(self.spool_path) or not self.sio.connected:
+            return not os.path.exists(self.spool_path)
+        with open(self.spool_path) as f:
+            f.seek(self.replay_offset)
+            while True:
+                lines = []
+                for _ in range(self.max_batch):
+                    line = f.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+                if not lines:
+                    break
+                alerts = [json.loads(line) for line in lines if line.strip()]
+                if alerts and not self._emit(alerts):
+                    return False
+                self.replay_offset = f.tell()
+                self.replayed += len(alerts)
+        os.remove(self.spool_path)
+        self.replay_offset = 0
+        return True
+
+    def _flush(self):
+        with self.lock:
+            alerts, self.pending = self.pending, []
+            seq = self.seq
+        if alerts:
+            tmp_path = self.seq_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(seq))
+            os.replace(tmp_path, self.seq_path)
+
+        self._connect()
+        # Older alerts go first: while the spool has not been replayed, new ones join it
+        if not self._replay():
+            if alerts:
+                self._spool(alerts)
+            return
+        for start in range(0, len(alerts), self.max_batch):
+            chunk = alerts[start:start + self.max_batch]
+            if self._emit(chunk):
+                self.sent += len(chunk)
+            else:
+                self._spool(alerts[start:])
+                return
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._flush()
+        self._flush()
+
+    def stop(self, timeout=10):
+        """Sends (or spools) what is still pending and stops the thread."""
+        self.stopped.set()
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {'sent': self.sent, 'spooled': self.spooled, 'replayed': self.replayed, 'pending': pending,
+                'last_seq': self.seq}
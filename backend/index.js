@@ -30,6 +30,15 @@ try {
   console.warn("⚠️ Couldn't read alerts.json, starting fresh.");
 }
 
+// Highest alert sequence number stored per ML client (batched alerts), so a batch
+// re-sent after a lost acknowledgement is not stored twice
+const lastSeqByClient = new Map();
+for (const alert of alerts) {
+  if (alert.client_id !== undefined && alert.seq !== undefined) {
+    lastSeqByClient.set(alert.client_id, Math.max(lastSeqByClient.get(alert.client_id) || 0, alert.seq));
+  }
+}
+
 // Save alerts to file
 const saveAlertsToFile = () => {
   fs.writeFile(ALERTS_FILE, JSON.stringify(alerts, null, 2), (err) => {
@@ -41,6 +50,17 @@ const saveAlertsToFile = () => {
   });
 };
 
+// Rewriting the whole file per alert is O(n) each time: save at most once per second
+const SAVE_DELAY_MS = 1000;
+let saveTimer = null;
+const scheduleSave = () => {
+  if (saveTimer) return;
+  saveTimer = setTimeout(() => {
+    saveTimer = null;
+    saveAlertsToFile();
+  }, SAVE_DELAY_MS);
+};
+
 // Send SMS with alert info
 const sendSMSAlert = (alertData) => {
   const message = `🚨 Alert received!\nMessage: ${
@@ -117,9 +137,34 @@ io.on("connection", (socket) => {
 
     // Broadcast to all clients
     io.emit("new_alert", alertWithTimestamp);
-    saveAlertsToFile();
+    scheduleSave();
     sendSMSAlert(alertWithTimestamp); // 🔔 Send SMS here
   });
+
+  // Batched alerts from alerting.AlertBatchClient: { client_id, first_seq, last_seq, alerts }
+  socket.on("send_alert_batch", (batch, ack) => {
+    const lastSeq = lastSeqByClient.get(batch.client_id) || 0;
+    const timestamp = new Date().toISOString();
+    const fresh = (batch.alerts || [])
+      .filter((alert) => alert.seq > lastSeq)
+      .map((alert) => ({ ...alert, client_id: batch.client_id, timestamp }));
+
+    if (fresh.length) {
+      console.log(`📨 ${fresh.length} alerts from ML (${batch.client_id} #${batch.first_seq}-${batch.last_seq})`);
+      alerts.push(...fresh);
+      lastSeqByClient.set(batch.client_id, Math.max(lastSeq, batch.last_seq));
+      fresh.forEach((alert) => io.emit("new_alert", alert));
+      scheduleSave();
+      // One SMS per batch
+      sendSMSAlert({
+        ...fresh[fresh.length - 1],
+        message: fresh.length > 1
+          ? `${fresh.length} alerts, latest: ${fresh[fresh.length - 1].message}`
+          : fresh[0].message,
+      });
+    }
+    if (typeof ack === "function") ack({ last_seq: Math.max(lastSeq, batch.last_seq) });
+  });
   socket.on("webcam_frame", (data) => {
     const { camera_id, image } = data;
 
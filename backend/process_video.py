@@ -1,9 +1,10 @@
 import cv2
-import numpy as np
-import gc
 import sys
 import os
-import time
+
+# heatmap.py lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from heatmap import HeatmapAccumulator, MotionSource
 
 # ---- Utility ----
 def log(msg, level="INFO"):
@@ -36,8 +37,9 @@ if not cap.isOpened():
 
 # ---- Video Processing Config ----
 resize_width, resize_height = 640, 360
-fgbg = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=25, detectShadows=True)
-heatmap_accum = np.zeros((resize_height, resize_width), dtype=np.float32)
+# Moving pixels (MOG2) accumulate without decay: the heatmap shows total activity so far
+heatmap = HeatmapAccumulator((resize_height, resize_width),
+                             source=MotionSource(history=200, var_threshold=25, detect_shadows=True))
 
 fps = cap.get(cv2.CAP_PROP_FPS)
 fps = fps if fps and fps > 0 else 20  # fallback
@@ -65,25 +67,15 @@ while cap.isOpened() and frame_count < max_frames:
 
     # Resize and apply background subtraction
     frame = cv2.resize(frame, (resize_width, resize_height))
-    fgmask = fgbg.apply(frame)
-    heatmap_accum += (fgmask > 0).astype(np.float32)
-
-    # Create heatmap overlay
-    normalized_heatmap = cv2.normalize(heatmap_accum, None, 0, 255, cv2.NORM_MINMAX)
-    colored_heatmap = cv2.applyColorMap(normalized_heatmap.astype(np.uint8), cv2.COLORMAP_JET)
-    overlay = cv2.addWeighted(frame, 0.7, colored_heatmap, 0.3, 0)
+    heatmap.add(frame)
 
-    out.write(overlay)
+    # Create heatmap overlay (buffers are reused, nothing to free per frame)
+    out.write(heatmap.overlay(frame, alpha=0.3))
     frame_count += 1
 
-    # Memory cleanup
-    del frame, fgmask, normalized_heatmap, colored_heatmap, overlay
-    gc.collect()
-
 # ---- Finalization ----
 cap.release()
 out.release()
-gc.collect()
 
 # ---- Output Validation ----
 if os.path.exists(output_path):
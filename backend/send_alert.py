@@ -2,29 +2,32 @@ from ultralytics import YOLO
 from deep_sort_realtime.deepsort_tracker import DeepSort
 import cv2
 import numpy as np
+import os
+import sys
 import time
 import socketio
 from datetime import datetime
-from flask import Flask, Response
+from flask import Flask, Response, request
 from threading import Thread
 
+# alerting.py / config_loader.py live in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from alerting import AlertBatchClient, AlertDispatcher
+from mjpeg import MJPEG_MIMETYPE, MjpegBroadcaster
+from config_loader import load_config
+
 # === Flask App for Webcam Stream ===
 app = Flask(__name__)
-output_frame = None
-
-def gen_frames():
-    global output_frame
-    while True:
-        if output_frame is None:
-            continue
-        _, buffer = cv2.imencode('.jpg', output_frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+# Each new frame is encoded once and shared; viewers wait on it instead of spinning
+broadcaster = MjpegBroadcaster(fps=15, quality=80)
 
 @app.route('/video1')
 def video():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional per-viewer limits, e.g. /video1?fps=5&quality=60
+    return Response(broadcaster.stream(fps=request.args.get('fps', type=float),
+                                       quality=request.args.get('quality', type=int)),
+                    mimetype=MJPEG_MIMETYPE)
 
 def run_flask():
     app.run(host='0.0.0.0', port=6924, debug=False, use_reloader=False)
@@ -50,11 +53,6 @@ def disconnect():
 def connect_error(data):
     print("❌ Connection failed:", data)
 
-try:
-    sio.connect('http://localhost:6969')  # change if hosted elsewhere
-except Exception as e:
-    print("Error connecting to server:", e)
-
 # === YOLO + DeepSORT Setup ===
 model = YOLO("yolov8n.pt")  # Use your trained model if any
 tracker = DeepSort(max_age=30, n_init=3)
@@ -65,18 +63,28 @@ print("🟢 Surveillance system started. Press 'Q' to stop.")
 loitering_time_threshold = 5
 track_locations = {}
 
-# Alert Function
-def send_alert(message, label, confidence):
+# Alerts are emitted from background threads: deduplicated per (camera, track, type),
+# muted for alert_cooldown_seconds after each delivery and coalesced in bursts, then sent
+# in acknowledged batches; while the server is down they are spooled to disk and replayed
+alert_cooldown = load_config(os.path.join(ROOT, "config.yaml"))['alerting'].get('alert_cooldown_seconds', 30)
+# The client connects (and reconnects, with backoff) to the alert server itself
+alert_client = AlertBatchClient(sio, client_id="CAM-001", spool_path=os.path.join(ROOT, "alert_spool.jsonl"),
+                                url='http://localhost:6969')  # change if hosted elsewhere
+dispatcher = AlertDispatcher(alert_client.send, cooldown_seconds=alert_cooldown)
+
+# Alert Function (never blocks the frame loop)
+def send_alert(message, label, confidence, track_id=None, alert_type=None):
     alert = {
         "message": message,
+        "type": alert_type or message,
         "camera_id": "CAM-001",
+        "track_id": track_id,
         "location": "Main Entrance - North Gate",
         "label": label,
         "confidence": round(confidence, 2),
         "detected_at": datetime.now().isoformat()
     }
-    sio.emit('send_alert', alert)
-    print("📨 Alert emitted:", alert["message"])
+    dispatcher.submit(alert)
 
 # === Main Loop ===
 while True:
@@ -122,8 +130,7 @@ while True:
                     if duration > loitering_time_threshold:
                         msg = f"🚨 Loitering detected - ID {track_id}"
                         cv2.putText(frame, msg, (x1, y1 - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)
-                        send_alert("Loitering Detected", label, 1.0)
-                        time.sleep(1)
+                        send_alert("Loitering Detected", label, 1.0, track_id, "loitering")
                 else:
                     track_locations[track_id] = {"pos": (center_x, center_y), "start_time": current_time}
 
@@ -131,8 +138,8 @@ while True:
         if label in ['knife', 'gun', 'bag']:
             msg = f"⚠ Suspicious Object: {label}"
             cv2.putText(frame, msg, (x1, y1 - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)
-            send_alert(f"Suspicious Object Detected: {label}", label, conf)
-            time.sleep(1)
+            send_alert(f"Suspicious Object Detected: {label}", label, track.get_det_conf() or 0.0,
+                       track_id, "suspicious_object")
 
         # Draw bounding box
         cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 100), 2)
@@ -145,7 +152,7 @@ while True:
     final_frame = cv2.addWeighted(frame, 0.7, heatmap_colored, 0.3, 0)
 
     # Set frame for Flask streaming
-    output_frame = final_frame.copy()
+    broadcaster.publish(final_frame)
 
     cv2.imshow("🛡 Real-Time Surveillance", final_frame)
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -153,4 +160,8 @@ while True:
 
 cap.release()
 cv2.destroyAllWindows()
+broadcaster.stop()
+dispatcher.stop()
+alert_client.stop()
+print("Alert stats:", dispatcher.stats(), alert_client.stats())
 sio.disconnect()
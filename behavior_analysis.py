@@ -1,134 +1,311 @@
 import time
+import cv2
 import numpy as np
 from collections import defaultdict, deque
-import cv2 # For pointPolygonTest
+from track_store import TrackStore
+
+
+class FenceZoneGeometry:
+    """
+    Edges of all fence polygons packed into flat arrays, so the signed distance of many
+    points to every zone is computed in one batch (same sign convention as
+    cv2.pointPolygonTest: > 0 inside, < 0 outside, 0 on the boundary).
+    """
+    def __init__(self, polygons):
+        self.num_zones = len(polygons)
+        starts, ends, zone_offsets = [], [], []
+        offset = 0
+        for poly in polygons:
+            poly = np.asarray(poly, dtype=np.float64).reshape(-1, 2)
+            starts.append(poly)
+            ends.append(np.roll(poly, -1, axis=0)) # Closing edge back to the first vertex
+            zone_offsets.append(offset)
+            offset += len(poly)
+        self.a = np.concatenate(starts) if starts else np.empty((0, 2))
+        self.b = np.concatenate(ends) if ends else np.empty((0, 2))
+        self.zone_offsets = np.array(zone_offsets, dtype=np.int64)
+        self.ab = self.b - self.a
+        self.ab_len2 = np.maximum((self.ab ** 2).sum(axis=1), 1e-12)
+
+    def signed_distance(self, points):
+        """Returns an (N, num_zones) array of signed distances from `points` (N, 2) to every zone."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.num_zones == 0 or len(points) == 0:
+            return np.empty((len(points), self.num_zones))
+        px, py = points[:, 0:1], points[:, 1:2] # (N, 1) against (E,) edges
+
+        # Distance to every edge: project onto the segment, clamp, measure
+        t = ((px - self.a[:, 0]) * self.ab[:, 0] + (py - self.a[:, 1]) * self.ab[:, 1]) / self.ab_len2
+        t = t.clip(0.0, 1.0)
+        dx = px - (self.a[:, 0] + t * self.ab[:, 0])
+        dy = py - (self.a[:, 1] + t * self.ab[:, 1])
+        edge_dist = np.sqrt(dx * dx + dy * dy)
+        dist = np.minimum.reduceat(edge_dist, self.zone_offsets, axis=1)
+
+        # Even-odd rule: count edges crossed by a ray going right from the point
+        ay, by = self.a[:, 1], self.b[:, 1]
+        straddles = (ay > py) != (by > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = self.a[:, 0] + (py - ay) * self.ab[:, 0] / (by - ay)
+        crossings = (straddles & (px < x_cross)).astype(np.int64)
+        inside = np.add.reduceat(crossings, self.zone_offsets, axis=1) % 2 == 1
+
+        return np.where(inside, dist, -dist)
+
+
+class FenceDistanceField:
+    """
+    Signed distance (pixels, float32) from every pixel of a camera's processing
+    resolution to the union of its fence zones: > 0 inside, < 0 outside.
+    Built once per (zones, resolution); proximity checks for all tracks then become a
+    single array gather instead of a polygon distance computation per track.
+    Values are measured between pixel centres, so they can differ from the exact
+    polygon distance by about a pixel.
+    """
+    def __init__(self, polygons, frame_shape):
+        self.height, self.width = frame_shape[:2]
+        inside = np.zeros((self.height, self.width), dtype=np.uint8)
+        for poly in polygons:
+            cv2.fillPoly(inside, [np.asarray(poly, dtype=np.int32).reshape(-1, 1, 2)], 255)
+
+        if not inside.any():
+            # Zones entirely off-screen: distance to the nearest zone is at least the frame size
+            self.field = np.full((self.height, self.width), -float(self.height + self.width), dtype=np.float32)
+            return
+        # Distance to the nearest zero pixel: outside pixels measure to the zone, inside ones to the outside
+        dist_outside = cv2.distanceTransform(cv2.bitwise_not(inside), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+        dist_inside = cv2.distanceTransform(inside, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+        self.field = dist_inside - dist_outside
+
+    def lookup(self, x, y):
+        """Signed distance for integer pixel coordinates `x`, `y` (arrays); clamped to the frame."""
+        return self.field[np.clip(y, 0, self.height - 1), np.clip(x, 0, self.width - 1)]
+
 
 class BehaviorAnalyzer:
     def __init__(self, config):
         self.config = config
-        # Store track history: track_id -> deque([(timestamp, center_x, center_y), ...])
-        self.track_history = defaultdict(lambda: deque(maxlen=100)) # Store last ~3 seconds at 30fps
-        # Store first seen timestamp for loitering: track_id -> timestamp
-        self.first_seen = {}
-        # Store last alert time for cooldown: track_id -> timestamp
-        self.last_alert_time = {}
-        # Store state: track_id -> { "loitering": False, "near_fence": False }
-        self.track_state = defaultdict(dict)
+        # Settings are read once here instead of per track per frame
+        self.loiter_threshold = config['behavior_analysis']['loitering_threshold_seconds']
+        self.proximity_threshold = config['behavior_analysis']['fence_proximity_threshold']
+        self.alert_cooldown = config['alerting']['alert_cooldown_seconds']
+
+        # Loitering = long presence with little movement inside a sliding time window
+        behavior = config['behavior_analysis']
+        self.loiter_window = behavior.get('loitering_window_seconds', self.loiter_threshold)
+        self.loiter_max_radius = behavior.get('loitering_max_radius_px', 40)
+        self.loiter_max_displacement = behavior.get('loitering_max_displacement_px', 60)
+        self.loiter_max_speed = behavior.get('loitering_max_speed_px_s', 80)
+
+        # Store track history: track_id -> deque([(timestamp, center_x, center_y, step), ...])
+        # `step` is the distance from the previous point; entries older than the window are dropped
+        self.track_history = defaultdict(deque)
+
+        # Per-track state: bounded, expiring struct of arrays indexed by slot
+        self.tracks = TrackStore({
+            'first_seen': (np.float64, 0.0), # First seen timestamp for loitering (0 = just created)
+            'last_alert_time': (np.float64, 0.0), # Last alert time for cooldown (0 = never)
+            'loitering': (np.bool_, False),
+            'near_fence': (np.bool_, False),
+            # Running sums over the points in the history window, for O(1) motion statistics
+            'win_count': (np.int64, 0),
+            'win_sum_x': (np.float64, 0.0),
+            'win_sum_y': (np.float64, 0.0),
+            'win_sum_xx': (np.float64, 0.0),
+            'win_sum_yy': (np.float64, 0.0),
+            'win_path': (np.float64, 0.0), # Path length between consecutive points in the window
+            'last_x': (np.float64, 0.0),
+            'last_y': (np.float64, 0.0),
+            'behavior': (np.int16, -1), # Latest LSTM behaviour class (-1 = not classified yet)
+            'behavior_prob': (np.float32, 0.0),
+        }, ttl_seconds=behavior.get('track_ttl_seconds', 60), max_tracks=behavior.get('max_tracks', 4096))
+        self.tracks.on_release.append(lambda track_id, slot: self.track_history.pop(track_id, None))
+
+        # Optional LSTM trajectory classifier (behavior_model.py); needs torch or onnxruntime
+        self.behavior_classifier = None
+        if behavior.get('behavior_model'):
+            from behavior_model import TrackBehaviorClassifier
+            self.behavior_classifier = TrackBehaviorClassifier(config, max_tracks=self.tracks.max_tracks)
+            self.tracks.on_release.append(lambda track_id, slot: self.behavior_classifier.release(slot))
 
+        self.set_fence_zones(config['behavior_analysis']['fence_zones'])
+
+
+    def set_fence_zones(self, fence_zones):
+        """(Re)defines the fence polygons; the distance field is rebuilt on the next frame."""
         self.fence_zones_poly = []
-        if config['behavior_analysis']['fence_zones']:
-             for zone in config['behavior_analysis']['fence_zones']:
+        if fence_zones:
+             for zone in fence_zones:
                  self.fence_zones_poly.append(np.array(zone, np.int32))
+        self.fence_geometry = FenceZoneGeometry(self.fence_zones_poly)
+        self.fence_field = None # Built lazily once the processing resolution is known
+
+
+    def _update_motion(self, slots, track_ids, x, y, current_time):
+        """
+        Appends the current positions to the track histories and updates the window running
+        sums (points in, points older than the window out), so each call is O(1) per track.
+        Returns per track: displacement across the window, radius of gyration and mean speed (px/s).
+        """
+        state = self.tracks
+        x = x.astype(np.float64)
+        y = y.astype(np.float64)
+        steps = np.where(state.win_count[slots] > 0,
+                         np.hypot(x - state.last_x[slots], y - state.last_y[slots]), 0.0)
 
+        # Points leaving the window: x, y, x^2, y^2, path, count
+        removed = np.zeros((len(slots), 6))
+        oldest = np.empty((len(slots), 3)) # t, x, y of the oldest point still in the window
+        cutoff = current_time - self.loiter_window
+        for i, (track_id, px, py, step) in enumerate(zip(track_ids.tolist(), x.tolist(), y.tolist(), steps.tolist())):
+            history = self.track_history[track_id]
+            history.append((current_time, px, py, step))
+            sum_x = sum_y = sum_xx = sum_yy = path = 0.0
+            count = 0
+            while len(history) > 1 and history[0][0] < cutoff:
+                _, old_x, old_y, _ = history.popleft()
+                sum_x += old_x
+                sum_y += old_y
+                sum_xx += old_x * old_x
+                sum_yy += old_y * old_y
+                path += history[0][3] # The step into the new oldest point leaves the window too
+                count += 1
+            if count:
+                removed[i] = (sum_x, sum_y, sum_xx, sum_yy, path, count)
+            oldest[i] = history[0][:3]
 
-    def update(self, tracks):
-        """Analyzes tracks for suspicious behavior."""
+        count = state.win_count[slots] + 1 - removed[:, 5].astype(np.int64)
+        sum_x = state.win_sum_x[slots] + x - removed[:, 0]
+        sum_y = state.win_sum_y[slots] + y - removed[:, 1]
+        sum_xx = state.win_sum_xx[slots] + x * x - removed[:, 2]
+        sum_yy = state.win_sum_yy[slots] + y * y - removed[:, 3]
+        path = np.maximum(state.win_path[slots] + steps - removed[:, 4], 0.0)
+        state.win_count[slots] = count
+        state.win_sum_x[slots] = sum_x
+        state.win_sum_y[slots] = sum_y
+        state.win_sum_xx[slots] = sum_xx
+        state.win_sum_yy[slots] = sum_yy
+        state.win_path[slots] = path
+        state.last_x[slots] = x
+        state.last_y[slots] = y
+
+        mean_x = sum_x / count
+        mean_y = sum_y / count
+        radius = np.sqrt(np.maximum(sum_xx / count - mean_x * mean_x + sum_yy / count - mean_y * mean_y, 0.0))
+        displacement = np.hypot(x - oldest[:, 1], y - oldest[:, 2])
+        span = current_time - oldest[:, 0]
+        speed = np.divide(path, span, out=np.zeros_like(path), where=span > 0)
+        return displacement, radius, speed
+
+
+    def update(self, tracks, frame_shape=None):
+        """
+        Analyzes tracks for suspicious behavior.
+        Pass the processing `frame_shape` to use the precomputed fence distance field.
+        """
         current_time = time.time()
-        active_track_ids = set()
         alerts = [] # List of dictionaries: {'type': 'loitering'/'fence', 'track_id': id, 'position': (x,y)}
 
-        if tracks is None or len(tracks) == 0:
-             # Clean up old tracks if no tracks detected in frame
-             self._cleanup_old_tracks(current_time, active_track_ids)
+        tracks = np.asarray(tracks if tracks is not None else [], dtype=np.float64)
+        # Assuming track format: [x1, y1, x2, y2, track_id, conf, cls]
+        if tracks.ndim != 2 or len(tracks) == 0 or tracks.shape[1] < 5:
+             # Expire old tracks even if no tracks detected in frame
+             self.tracks.expire(current_time)
              return alerts
 
-        for track in tracks:
-            # Assuming track format: [x1, y1, x2, y2, track_id, conf, cls]
-            if len(track) < 5: continue
-            x1, y1, x2, y2 = map(int, track[:4])
-            track_id = int(track[4])
-            active_track_ids.add(track_id)
-            center_x = (x1 + x2) // 2
-            center_y = (y1 + y2) // 2 # Using bottom center might be better for proximity
-            bottom_center_y = y2
-
-            # Update history
-            self.track_history[track_id].append((current_time, center_x, bottom_center_y))
-
-            # --- 1. Loitering Detection ---
-            loiter_threshold = self.config['behavior_analysis']['loitering_threshold_seconds']
-            alert_cooldown = self.config['alerting']['alert_cooldown_seconds']
-
-            if track_id not in self.first_seen:
-                self.first_seen[track_id] = current_time
-                self.track_state[track_id]['loitering'] = False # Initial state
-
-            # Check duration
-            duration = current_time - self.first_seen[track_id]
-            is_currently_loitering = False
-            if duration > loiter_threshold:
-                # Optional: Check if movement is minimal within the history duration
-                # Simple check: just time presence for now
-                is_currently_loitering = True
-
-
-            # Trigger alert only if state changes to loitering and cooldown passed
-            if is_currently_loitering and not self.track_state[track_id].get('loitering', False):
-                 last_alert = self.last_alert_time.get(track_id, 0)
-                 if current_time - last_alert > alert_cooldown:
-                     alerts.append({
-                         'type': 'loitering',
-                         'track_id': track_id,
-                         'duration': duration,
-                         'position': (center_x, bottom_center_y),
-                         'timestamp': current_time
-                     })
-                     self.last_alert_time[track_id] = current_time
-                     self.track_state[track_id]['loitering'] = True # Update state
-            elif not is_currently_loitering:
-                 self.track_state[track_id]['loitering'] = False # Reset state if not loitering
-
-
-            # --- 2. Fence Proximity / Tampering Detection ---
-            proximity_threshold = self.config['behavior_analysis']['fence_proximity_threshold']
-            is_near_fence = False
-            if self.fence_zones_poly:
-                for zone_poly in self.fence_zones_poly:
-                    # Check distance from track's bottom center point to the polygon boundary
-                    dist = cv2.pointPolygonTest(zone_poly, (center_x, bottom_center_y), True)
-                    # dist > 0: inside, dist < 0: outside, dist == 0: on boundary
-                    # Check if point is close to the boundary (negative dist close to 0) or inside
-                    if dist >= -proximity_threshold: # Close to or inside the zone
-                        is_near_fence = True
-                        break # Found near at least one zone
-
-
-            # Trigger alert only if state changes to near_fence and cooldown passed
-            if is_near_fence and not self.track_state[track_id].get('near_fence', False):
-                 last_alert = self.last_alert_time.get(track_id, 0) # Share cooldown or use separate?
-                 if current_time - last_alert > alert_cooldown:
-                     alerts.append({
-                         'type': 'fence_proximity',
-                         'track_id': track_id,
-                         'position': (center_x, bottom_center_y),
-                         'timestamp': current_time
-                     })
-                     self.last_alert_time[track_id] = current_time
-                     self.track_state[track_id]['near_fence'] = True # Update state
-            elif not is_near_fence:
-                 self.track_state[track_id]['near_fence'] = False # Reset state
-
-            # --- 3. Other Behaviors (Placeholders) ---
-            # TODO: Add crawling detection (requires pose estimation or aspect ratio analysis)
-            # TODO: Add drone detection alert (based on class from detector)
-
-
-        # --- Cleanup old track data ---
-        self._cleanup_old_tracks(current_time, active_track_ids)
+        track_ids = tracks[:, 4].astype(np.int64)
+        slots = self.tracks.slots_for(track_ids, current_time)
+        if (slots < 0).any(): # Store full of tracks seen this frame; skip the overflow
+            tracks, track_ids, slots = tracks[slots >= 0], track_ids[slots >= 0], slots[slots >= 0]
+        state = self.tracks
+        new_tracks = slots[state.first_seen[slots] == 0.0]
+        state.first_seen[new_tracks] = current_time
+
+        boxes = tracks[:, :4].astype(np.int64)
+        center_x = (boxes[:, 0] + boxes[:, 2]) // 2
+        bottom_center_y = boxes[:, 3] # Bottom center is used for ground position / proximity
+
+        # Update history and the window running sums
+        displacement, radius, speed = self._update_motion(slots, track_ids, center_x, bottom_center_y, current_time)
+
+        if self.behavior_classifier is not None:
+            # The classifier was trained on box centers
+            classified, index, prob = self.behavior_classifier.update(slots, center_x, (boxes[:, 1] + boxes[:, 3]) / 2)
+            state.behavior[classified] = index
+            state.behavior_prob[classified] = prob
+
+        # --- 1. Loitering Detection ---
+        # Present long enough and barely moved within the window (walking past does not count)
+        duration = current_time - state.first_seen[slots]
+        is_loitering = ((duration > self.loiter_threshold) & (displacement <= self.loiter_max_displacement) &
+                        (radius <= self.loiter_max_radius) & (speed <= self.loiter_max_speed))
+        # Trigger alert only if state changes to loitering and cooldown passed
+        cooldown_passed = current_time - state.last_alert_time[slots] > self.alert_cooldown
+        loiter_alert = is_loitering & ~state.loitering[slots] & cooldown_passed
+        for i in np.flatnonzero(loiter_alert):
+            alerts.append({
+                'type': 'loitering',
+                'track_id': int(track_ids[i]),
+                'duration': float(duration[i]),
+                'displacement': float(displacement[i]),
+                'radius': float(radius[i]),
+                'speed': float(speed[i]),
+                'position': (int(center_x[i]), int(bottom_center_y[i])),
+                'timestamp': current_time
+            })
+        state.last_alert_time[slots[loiter_alert]] = current_time
+        state.loitering[slots[loiter_alert]] = True # Update state
+        state.loitering[slots[~is_loitering]] = False # Reset state if not loitering
+
+        # --- 2. Fence Proximity / Tampering Detection ---
+        if self.fence_geometry.num_zones and frame_shape is not None:
+            if self.fence_field is None or (self.fence_field.height, self.fence_field.width) != tuple(frame_shape[:2]):
+                self.fence_field = FenceDistanceField(self.fence_zones_poly, frame_shape)
+            # One gather for all tracks: signed distance of the bottom center to the nearest zone
+            dist = self.fence_field.lookup(center_x, bottom_center_y)
+            # Close to the boundary (negative dist close to 0) or inside a zone
+            is_near_fence = dist >= -self.proximity_threshold
+        elif self.fence_geometry.num_zones:
+            # Signed distance of every track's bottom center to every zone boundary
+            dist = self.fence_geometry.signed_distance(np.stack((center_x, bottom_center_y), axis=1))
+            # Close to the boundary (negative dist close to 0) or inside any zone
+            is_near_fence = (dist >= -self.proximity_threshold).any(axis=1)
+        else:
+            is_near_fence = np.zeros(len(tracks), dtype=bool)
+        # Shares the cooldown with loitering, so re-check after the loitering alerts above
+        cooldown_passed = current_time - state.last_alert_time[slots] > self.alert_cooldown
+        fence_alert = is_near_fence & ~state.near_fence[slots] & cooldown_passed
+        for i in np.flatnonzero(fence_alert):
+            alerts.append({
+                'type': 'fence_proximity',
+                'track_id': int(track_ids[i]),
+                'position': (int(center_x[i]), int(bottom_center_y[i])),
+                'timestamp': current_time
+            })
+        state.last_alert_time[slots[fence_alert]] = current_time
+        state.near_fence[slots[fence_alert]] = True # Update state
+        state.near_fence[slots[~is_near_fence]] = False # Reset state
+
+        # --- 3. Other Behaviors (Placeholders) ---
+        # TODO: Add crawling detection (requires pose estimation or aspect ratio analysis)
+        # TODO: Add drone detection alert (based on class from detector)
+
+        # --- Expire old track data ---
+        self.tracks.expire(current_time)
 
         return alerts
 
-    def _cleanup_old_tracks(self, current_time, active_track_ids):
-        """Removes data for tracks that haven't been seen for a while."""
-        cleanup_threshold = 60 # Seconds after which to remove inactive track data
-        ids_to_remove = [
-            tid for tid, history in self.track_history.items()
-            if tid not in active_track_ids and history and (current_time - history[-1][0] > cleanup_threshold)
-        ]
-
-        for tid in ids_to_remove:
-            if tid in self.track_history: del self.track_history[tid]
-            if tid in self.first_seen: del self.first_seen[tid]
-            if tid in self.last_alert_time: del self.last_alert_time[tid]
-            if tid in self.track_state: del self.track_state[tid]
-            # print(f"Cleaned up data for inactive track ID: {tid}")
\ No newline at end of file
+    def behavior_labels(self, track_ids):
+        """Latest LSTM behaviour label per track id (None if unknown or no classifier is configured)."""
+        if self.behavior_classifier is None:
+            return [None] * len(track_ids)
+        labels = []
+        for track_id in np.asarray(track_ids, dtype=np.int64).tolist():
+            slot = self.tracks.slot_of.get(track_id)
+            index = -1 if slot is None else int(self.tracks.behavior[slot])
+            labels.append(self.behavior_classifier.labels[index] if index >= 0 else None)
+        return labels
+
+    def stats(self):
+        """Track lifecycle metrics (live / expired / evicted counts)."""
+        return self.tracks.stats()
@@ -0,0 +1,238 @@
+# LSTM trajectory behaviour classifier (lstm_model.pth / lstm_behavior_extended.pth),
+# run for all tracks of a frame in one batched call, with per-track recurrent state.
+#
+# Export the checkpoints once:
+#     python behavior_model.py lstm_model.pth --format torchscript   # -> lstm_model.pt
+#     python behavior_model.py lstm_model.pth --format onnx          # -> lstm_model.onnx
+# and point `behavior_model` in config.yaml at the .pth, .pt or .onnx file.
+
+import argparse
+import os
+import platform
+import numpy as np
+from model_variants import variant_path
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Labels of the 3-class model trained in live-model.ipynb
+DEFAULT_LABELS = ["Walking", "Standing", "Loitering"]
+
+
+# The PyTorch model is only defined when torch is installed: ONNX exports run on onnxruntime alone
+if torch is not None:
+    class BehaviorClassifier(torch.nn.Module):
+        """LSTM(2 -> hidden) + Linear(hidden -> classes), as trained in live-model.ipynb."""
+        def __init__(self, hidden_size=64, num_classes=3):
+            super().__init__()
+            self.hidden_size = hidden_size # Kept as attributes: quantized / scripted copies have no plain weights
+            self.num_classes = num_classes
+            self.lstm = torch.nn.LSTM(input_size=2, hidden_size=hidden_size, batch_first=True)
+            self.fc = torch.nn.Linear(hidden_size, num_classes)
+
+        def forward(self, x):
+            """Classifies whole (B, T, 2) trajectories from a zero state, like the notebook."""
+            _, (h, _) = self.lstm(x)
+            return self.fc(h[-1])
+
+        @torch.jit.export
+        def step(self, x, h, c):
+            """
+            Advances B tracks by one (x, y) point each: x (B, 2), h / c (B, hidden).
+            Returns (logits (B, classes), h, c).
+            """
+            _, (h, c) = self.lstm(x.unsqueeze(1), (h.unsqueeze(0), c.unsqueeze(0)))
+            return self.fc(h[0]), h[0], c[0]
+
+    class _StepModule(torch.nn.Module):
+        """Exposes `step` as `forward` for the ONNX exporter."""
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x, h, c):
+            return self.model.step(x, h, c)
+
+
+def _require_torch(model_path):
+    if torch is None:
+        raise ImportError(f"torch is not installed. Install it to run {model_path}, or export it to .onnx.")
+
+
+def select_quantized_engine():
+    """Picks the int8 kernel backend for dynamic-quantized models: qnnpack on ARM (Raspberry Pi)."""
+    engines = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ('aarch64', 'arm64', 'armv7l') and 'qnnpack' in engines:
+        torch.backends.quantized.engine = 'qnnpack'
+    elif 'x86' in engines:
+        torch.backends.quantized.engine = 'x86'
+    elif 'fbgemm' in engines:
+        torch.backends.quantized.engine = 'fbgemm'
+    return torch.backends.quantized.engine
+
+
+def load_checkpoint(path):
+    """Builds a BehaviorClassifier from a state dict; hidden size and class count come from the weights."""
+    _require_torch(path)
+    state_dict = torch.load(path, map_location='cpu')
+    hidden_size = state_dict['lstm.weight_hh_l0'].shape[1]
+    num_classes = state_dict['fc.weight'].shape[0]
+    model = BehaviorClassifier(hidden_size, num_classes)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+
+def export_model(path, fmt='torchscript', output_path=None):
+    """Exports a .pth checkpoint to TorchScript (.pt, forward + step) or ONNX (.onnx, step only)."""
+    model = load_checkpoint(path)
+    hidden_size = model.lstm.hidden_size
+    output_path = output_path or os.path.splitext(path)[0] + ('.onnx' if fmt == 'onnx' else '.pt')
+    if fmt == 'onnx':
+        x, h = torch.zeros(1, 2), torch.zeros(1, hidden_size)
+        torch.onnx.export(_StepModule(model), (x, h, h.clone()), output_path,
+                          input_names=['x', 'h', 'c'], output_names=['logits', 'h_out', 'c_out'],
+                          dynamic_axes={name: {0: 'batch'} for name in ['x', 'h', 'c', 'logits', 'h_out', 'c_out']},
+                          opset_version=12)
+    else:
+        torch.jit.script(model).save(output_path)
+    print(f"Exported {path} -> {output_path}")
+    return output_path
+
+
+class BehaviorModel:
+    """
+    Inference wrapper over a .pth checkpoint, a TorchScript export (.pt) or an ONNX export
+    (.onnx, run with ONNX Runtime). `step` takes and returns numpy arrays.
+    """
+    def __init__(self, model_path, labels=None, num_threads=0):
+        self.model_path = model_path
+        self.session = None
+        self.model = None
+        if model_path.endswith('.onnx'):
+            if onnxruntime is None:
+                raise ImportError("onnxruntime is not installed. Install it to run .onnx behaviour models.")
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+            h_input = self.session.get_inputs()[1]
+            self.hidden_size = h_input.shape[1]
+            self.num_classes = self.session.get_outputs()[0].shape[1]
+        else:
+            _require_torch(model_path)
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            if model_path.endswith('.pt'):
+                select_quantized_engine() # In case this is a quantize.py int8 export
+                self.model = torch.jit.load(model_path, map_location='cpu')
+                self.model.eval()
+            else:
+                self.model = load_checkpoint(model_path)
+            self.hidden_size = self.model.hidden_size
+            self.num_classes = self.model.num_classes
+
+        if labels is None and self.num_classes == len(DEFAULT_LABELS):
+            labels = DEFAULT_LABELS
+        self.labels = list(labels) if labels else [f"class_{i}" for i in range(self.num_classes)]
+        if len(self.labels) != self.num_classes:
+            raise ValueError(f"{model_path} has {self.num_classes} classes but {len(self.labels)} labels were given")
+        print(f"Behaviour model loaded: {model_path} ({self.num_classes} classes: {', '.join(self.labels)})")
+
+    def step(self, x, h, c):
+        """x (B, 2), h / c (B, hidden) float32 -> (probabilities (B, classes), h, c)."""
+        if self.session is not None:
+            logits, h, c = self.session.run(None, {'x': x, 'h': h, 'c': c})
+        else:
+            with torch.inference_mode():
+                logits, h, c = self.model.step(torch.from_numpy(x), torch.from_numpy(h), torch.from_numpy(c))
+            logits, h, c = logits.numpy(), h.numpy(), c.numpy()
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True), h, c
+
+
+class TrackBehaviorClassifier:
+    """
+    Streaming classification of the trajectories of all tracks of one source.
+
+    The LSTM (h, c) state of every track lives in preallocated (max_tracks, hidden) arrays
+    indexed by the track's TrackStore slot; a slot's rows are zeroed when its track is
+    released, so they are recycled without allocating. Each frame feeds only the newest
+    point of each track (one batched `step` over all of them), so the cost per frame does
+    not depend on how long the tracks are. With `every_n_frames` > 1 the points are buffered
+    per slot and fed as one padded batch, one `step` per buffered timestep.
+    Note the state spans the whole life of a track rather than the 20-point windows the
+    notebook classified.
+    """
+    def __init__(self, config, max_tracks=4096):
+        behavior = config['behavior_analysis']
+        model_path = variant_path(behavior['behavior_model'], behavior.get('behavior_precision', 'fp32'), kind='lstm')
+        self.model = BehaviorModel(model_path, labels=behavior.get('behavior_labels'),
+                                   num_threads=behavior.get('behavior_num_threads', 0))
+        self.labels = self.model.labels
+        self.every_n_frames = max(1, int(behavior.get('behavior_every_n_frames', 1)))
+        self.min_steps = behavior.get('behavior_min_steps', 10) # The notebook needed 10 points first
+        self.frame_count = 0
+
+        # State pool: float32 numpy arrays, passed to torch with from_numpy (no copy)
+        hidden = self.model.hidden_size
+        self.h = np.zeros((max_tracks, hidden), np.float32)
+        self.c = np.zeros((max_tracks, hidden), np.float32)
+        self.steps = np.zeros(max_tracks, np.int64) # Points fed so far per slot
+        self.pending = np.zeros((self.every_n_frames, max_tracks, 2), np.float32) # Buffered points
+        self.pending_count = np.zeros(max_tracks, np.int64)
+
+    def update(self, slots, x, y):
+        """
+        Adds one point per track (box centers, in pixels like the training data); `slots`
+        are the tracks' TrackStore slots. Returns (slots, class_index, probability) arrays
+        for the tracks classified on this frame: none between classification frames and
+        none for tracks with fewer than `min_steps` points.
+        """
+        self.pending[self.pending_count[slots], slots, 0] = x
+        self.pending[self.pending_count[slots], slots, 1] = y
+        self.pending_count[slots] += 1
+
+        self.frame_count += 1
+        active = np.flatnonzero(self.pending_count)
+        if self.frame_count % self.every_n_frames or len(active) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+
+        counts = self.pending_count[active]
+        probs = np.zeros((len(active), self.model.num_classes), np.float32)
+        for t in range(counts.max()):
+            rows = np.flatnonzero(counts > t) # Tracks that have a point at timestep t
+            step_slots = active[rows]
+            probs[rows], self.h[step_slots], self.c[step_slots] = self.model.step(
+                self.pending[t, step_slots], self.h[step_slots], self.c[step_slots])
+        self.steps[active] += counts
+        self.pending_count[active] = 0
+
+        ready = self.steps[active] >= self.min_steps
+        probs = probs[ready]
+        index = probs.argmax(axis=1)
+        return active[ready], index, probs[np.arange(len(index)), index]
+
+    def release(self, slot):
+        """Resets a slot whose track is gone, ready for the next track."""
+        self.h[slot] = 0.0
+        self.c[slot] = 0.0
+        self.steps[slot] = 0
+        self.pending_count[slot] = 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an LSTM behaviour checkpoint to TorchScript or ONNX")
+    parser.add_argument('checkpoint', help="Path to a .pth state dict (e.g. lstm_model.pth)")
+    parser.add_argument('--format', choices=['torchscript', 'onnx'], default='torchscript')
+    parser.add_argument('--output', default=None, help="Output path (default: next to the checkpoint)")
+    args = parser.parse_args()
+    export_model(args.checkpoint, args.format, args.output)
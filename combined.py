@@ -1,25 +1,31 @@
 import cv2
-from ultralytics import YOLO
-from inference_sdk import InferenceHTTPClient
+from detection import Detector
+from detection_coordinator import DetectionCoordinator
+from drone_detection import DroneDetector
 
 # ---------------- CONFIG ----------------
 YOLO_MODEL_PATH = "yolov8n.pt"  # YOLO model for person and vehicle detection
 FRAME_RESIZE = (640, 480)
+DEVICE = "cpu"  # or a GPU index, e.g. 0
 
-# Roboflow Inference Client
-CLIENT = InferenceHTTPClient(
-    api_url="https://detect.roboflow.com",
-    api_key="tm3sZ8ebG8ZjGyKa8nZV"
-)
-ROBOFLOW_MODEL_ID = "drones_new/3"
+# Local drone model (ONNX or NCNN export of the drones_new/3 model), see drone_detection.py
+DRONE_MODEL_PATH = "models/drones.onnx"
+DRONE_CONFIDENCE = 0.40
 # ----------------------------------------
 
 # Define class IDs (COCO dataset)
 PERSON_CLASS = 0
 VEHICLE_CLASSES = [2, 3, 5, 7]   # Car, Motorcycle, Bus, Truck
 
-# Load the YOLOv8 model
-person_vehicle_model = YOLO(YOLO_MODEL_PATH)
+# Load the models; the coordinator runs each once per frame, both at the same time
+person_vehicle_detector = Detector(YOLO_MODEL_PATH, None, device=DEVICE, config={
+    'processing': {'confidence_threshold': 0.4, 'iou_threshold': 0.5, 'detection_classes': None}})
+drone_detector = DroneDetector(DRONE_MODEL_PATH, device=DEVICE, confidence=DRONE_CONFIDENCE)
+coordinator = DetectionCoordinator(
+    {'coco': person_vehicle_detector, 'drone': drone_detector},
+    {'person': ('coco', [PERSON_CLASS], 0.5),
+     'vehicle': ('coco', VEHICLE_CLASSES, 0.4),
+     'drone': ('drone', None, DRONE_CONFIDENCE)})
 
 # Setup webcam
 cap = cv2.VideoCapture(0)
@@ -37,48 +43,17 @@ while True:
 
     frame = cv2.resize(frame, FRAME_RESIZE)
 
-    # --- YOLOv8 Detection for Person and Vehicle ---
-    yolo_results = person_vehicle_model(frame)
-    for result in yolo_results:
-        for box in result.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = box.conf[0].item()
-            cls = int(box.cls[0].item())
-            label = person_vehicle_model.names[cls]
-            # Person detection
-            if cls == PERSON_CLASS and conf > 0.5:
-                color = (0, 255, 0)  # Green
-                text = f"Person {conf:.2f}"
-            # Vehicle detection
-            elif cls in VEHICLE_CLASSES and conf > 0.4:
-                color = (255, 165, 0)  # Orange
-                text = f"{label} {conf:.2f}"
-            else:
-                continue
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, text, (x1, y1 - 5),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # --- Roboflow Drone Detection ---
-    try:
-        response = CLIENT.infer(frame, model_id=ROBOFLOW_MODEL_ID)
-        predictions = response["predictions"]
-    except Exception as e:
-        print("❌ Drone prediction error:", e)
-        predictions = []
-
-    for obj in predictions:
-        x, y = int(obj["x"]), int(obj["y"])
-        w, h = int(obj["width"]), int(obj["height"])
-        conf = float(obj["confidence"])
-        # Draw drone box in red
-        x1 = x - w // 2
-        y1 = y - h // 2
-        x2 = x + w // 2
-        y2 = y + h // 2
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-        cv2.putText(frame, f"Drone {conf:.2f}", (x1, y1 - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+    # --- One pass per model; person / vehicle / drone views are slices of its result ---
+    views = coordinator.detect(frame)
+    boxes = [((0, 255, 0), "Person", det) for det in views["person"]]  # Green
+    boxes += [((255, 165, 0), person_vehicle_detector.class_names[int(det[5])], det)
+              for det in views["vehicle"]]  # Orange
+    boxes += [((0, 0, 255), "Drone", det) for det in views["drone"]]  # Red
+    for color, label, det in boxes:
+        x1, y1, x2, y2 = map(int, det[:4])
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"{label} {det[4]:.2f}", (x1, y1 - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
     # --- Display Frame ---
     cv2.imshow("🚀 Combined Detection", frame)
@@ -86,6 +61,7 @@ while True:
         break
 
 # Cleanup
+coordinator.close()
 cap.release()
 cv2.destroyAllWindows()
 print("✅ Detection stopped.")
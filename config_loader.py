@@ -0,0 +1,39 @@
+import yaml
+
+# config.yaml is flat; the modules read their settings from these sections
+# (e.g. config['processing']['confidence_threshold']).
+CONFIG_SECTIONS = {
+    'processing': ['confidence_threshold', 'iou_threshold', 'detection_classes', 'max_latency_ms',
+                   'frame_skip', 'adaptive_scheduling', 'max_frame_skip', 'imgsz_steps', 'latency_headroom',
+                   'adjust_every_n_samples', 'imgsz', 'onnx_num_threads', 'detector_precision', 'device',
+                   'roi_tiling', 'roi_tile_size', 'roi_tile_overlap', 'roi_margin_px', 'roi_include_full_frame',
+                   'motion_gate', 'motion_gate_method', 'motion_gate_scale', 'motion_min_area_ratio',
+                   'motion_keepalive_seconds', 'motion_regions', 'motion_region_margin_px'],
+    'tracking': ['tracker_type', 'tracker_config'],
+    'behavior_analysis': ['loitering_threshold_seconds', 'loitering_window_seconds', 'loitering_max_radius_px',
+                          'loitering_max_displacement_px', 'loitering_max_speed_px_s', 'fence_zones',
+                          'fence_proximity_threshold', 'track_ttl_seconds', 'max_tracks', 'behavior_model',
+                          'behavior_labels', 'behavior_every_n_frames', 'behavior_min_steps', 'behavior_num_threads',
+                          'behavior_precision'],
+    'alerting': ['alert_cooldown_seconds', 'enable_console_alerts', 'enable_sms_alerts', 'twilio_sid',
+                 'twilio_token', 'twilio_from', 'twilio_to', 'enable_webhook_alerts', 'webhook_url'],
+    'visualization': ['show_video', 'draw_detections', 'draw_tracks', 'draw_segmentation',
+                      'draw_fence_zones', 'draw_heatmaps', 'heatmap_source', 'heatmap_decay', 'heatmap_alpha',
+                      'heatmap_store_dir', 'heatmap_store_grid', 'heatmap_store_dtype', 'output_video_path'],
+    'pipeline': ['queue_size', 'live_drop_policy', 'file_drop_policy', 'max_batch_size'],
+}
+
+
+def load_config(path="config.yaml"):
+    """
+    Loads config.yaml and groups its keys into the sections listed in CONFIG_SECTIONS.
+    The flat keys stay available at the top level as well.
+    """
+    with open(path, 'r') as f:
+        raw = yaml.safe_load(f) or {}
+
+    config = dict(raw)
+    for section, keys in CONFIG_SECTIONS.items():
+        config[section] = {key: raw[key] for key in keys if key in raw}
+    config.setdefault('sources', [])
+    return config
@@ -2,6 +2,8 @@ from ultralytics import YOLO
 import torch
 import time
 import os
+from onnx_backend import OnnxYoloModel
+from model_variants import variant_path
 
 class Detector:
     def __init__(self, model_path_rgb, model_path_thermal, device='cpu', config=None):
@@ -23,61 +25,68 @@ class Detector:
 
 
     def _load_model(self, model_path):
+        # int8 / fp16 variants written by quantize.py, picked with `detector_precision`
+        model_path = variant_path(model_path, (self.config or {}).get('processing', {}).get('detector_precision', 'fp32'),
+                                  kind='detector')
         if not model_path or not os.path.exists(model_path):
              print(f"Warning: Model file not found at {model_path}. Detection will be skipped for this type.")
              return None
         try:
-            # TODO: Add logic here to load ONNX or TensorRT models if path ends with .onnx or .engine
-            # Example for ONNX (requires onnxruntime):
-            # if model_path.endswith('.onnx'):
-            #     import onnxruntime
-            #     sess_options = onnxruntime.SessionOptions()
-            #     # Add TensorRT provider options if applicable
-            #     providers = ['TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider']
-            #     model = onnxruntime.InferenceSession(model_path, sess_options=sess_options, providers=providers)
-            #     print(f"Loaded ONNX model: {model_path} with providers: {model.get_providers()}")
-            #     return model # Need to adapt predict method for ONNX
-
-            # Example for PyTorch (.pt) using Ultralytics
+            if model_path.endswith('.onnx'):
+                processing = (self.config or {}).get('processing', {})
+                model = OnnxYoloModel(model_path, imgsz=processing.get('imgsz', 640),
+                                      num_threads=processing.get('onnx_num_threads', 0))
+                print(f"Loaded ONNX model: {model_path}")
+                return model
+            if model_path.endswith('.engine'):
+                print(f"Warning: TensorRT engines are not supported yet ({model_path}). Detection will be skipped for this type.")
+                return None
+
+            # PyTorch (.pt) or an exported format ultralytics runs itself (e.g. an NCNN model directory)
             model = YOLO(model_path)
-            model.to(self.device)
-            print(f"Loaded PyTorch YOLO model: {model_path}")
+            if model_path.endswith('.pt'):
+                model.to(self.device)
+            print(f"Loaded YOLO model: {model_path}")
             return model
         except Exception as e:
             print(f"Error loading model {model_path}: {e}")
             return None
 
-    def predict(self, frame, is_thermal=False):
+    def _run_model(self, model, frames, imgsz=None, **overrides):
+        """
+        Runs one forward pass over a list of frames and returns one detection array per frame.
+        `imgsz` overrides the inference size (e.g. lowered by the AdaptiveScheduler under load);
+        `overrides` replace confidence_threshold / iou_threshold / detection_classes from the config.
+        """
+        processing = dict(self.config['processing'], **overrides)
+        conf = processing['confidence_threshold']
+        iou = processing['iou_threshold']
+        classes = processing['detection_classes']
+
+        # Adapt based on model type (PyTorch/ONNX/TensorRT)
+        if isinstance(model, YOLO): # Ultralytics YOLO
+            # A list input is letterboxed and stacked into a single batch by ultralytics
+            extra_args = {'imgsz': imgsz} if imgsz else {}
+            results = model.predict(frames, conf=conf, iou=iou, classes=classes, verbose=False, device=self.device, **extra_args)
+            return [r.boxes.data.cpu().numpy() for r in results] # xyxy, conf, cls
+        if isinstance(model, OnnxYoloModel): # ONNX Runtime (CPU)
+            return model.predict(frames, conf=conf, iou=iou, classes=classes, imgsz=imgsz) # Same [x1,y1,x2,y2,conf,cls] rows
+        print("Warning: Unsupported model type for prediction.")
+        return [[] for _ in frames]
+
+    def predict(self, frame, is_thermal=False, imgsz=None):
         """Runs detection on a single frame."""
         model = self.model_thermal if is_thermal else self.model_rgb
         if model is None:
             return [], 0.0 # No detections if model isn't loaded
 
-        conf = self.config['processing']['confidence_threshold']
-        iou = self.config['processing']['iou_threshold']
-        classes = self.config['processing']['detection_classes']
         latency = 0.0
 
         try:
             start_time = time.perf_counter()
 
             # --- Perform Inference ---
-            # Adapt based on model type (PyTorch/ONNX/TensorRT)
-            if isinstance(model, YOLO): # Ultralytics YOLO
-                results = model.predict(frame, conf=conf, iou=iou, classes=classes, verbose=False, device=self.device)
-                # Process results: ultralytics returns a list, take first element
-                detections = results[0].boxes.data.cpu().numpy() # xyxy, conf, cls
-            # elif isinstance(model, onnxruntime.InferenceSession):
-                # Preprocess frame for ONNX
-                # input_name = model.get_inputs()[0].name
-                # output_names = [output.name for output in model.get_outputs()]
-                # preprocessed_frame = preprocess_for_onnx(frame) # Implement this function
-                # onnx_detections_raw = model.run(output_names, {input_name: preprocessed_frame})
-                # detections = postprocess_onnx_output(onnx_detections_raw) # Implement this function
-            else:
-                 print("Warning: Unsupported model type for prediction.")
-                 detections = []
-
+            detections = self._run_model(model, [frame], imgsz)[0]
 
             end_time = time.perf_counter()
             latency = (end_time - start_time) * 1000 # Latency in ms
@@ -86,4 +95,44 @@ class Detector:
 
         except Exception as e:
             print(f"Error during detection: {e}")
-            return [], latency # Return empty list on error
\ No newline at end of file
+            return [], latency # Return empty list on error
+
+    def predict_batch(self, frames, is_thermal_flags=None, imgsz=None):
+        """
+        Runs detection on the latest frame of several sources at once.
+        Frames are grouped per model (RGB / thermal) so each model does a single
+        batched forward pass. Returns a list of (detections, latency_ms) tuples in
+        the same order as `frames`; a source's latency is its share of its batch time.
+        """
+        if is_thermal_flags is None:
+            is_thermal_flags = [False] * len(frames)
+        if len(is_thermal_flags) != len(frames):
+            raise ValueError("predict_batch: frames and is_thermal_flags must have the same length")
+
+        outputs = [([], 0.0)] * len(frames)
+
+        for is_thermal in (False, True):
+            # Skip missing frames (e.g. a camera that has not delivered yet)
+            indices = [i for i, (frame, flag) in enumerate(zip(frames, is_thermal_flags))
+                       if bool(flag) == is_thermal and frame is not None]
+            if not indices:
+                continue
+            model = self.model_thermal if is_thermal else self.model_rgb
+            if model is None:
+                continue # No detections if model isn't loaded
+
+            batch_latency = 0.0
+            try:
+                start_time = time.perf_counter()
+                batch_detections = self._run_model(model, [frames[i] for i in indices], imgsz)
+                batch_latency = (time.perf_counter() - start_time) * 1000 # Latency in ms
+            except Exception as e:
+                print(f"Error during batched detection: {e}")
+                batch_detections = [[] for _ in indices]
+
+            # Attribute the batch cost evenly to every source that took part in it
+            per_source_latency = batch_latency / len(indices)
+            for i, detections in zip(indices, batch_detections):
+                outputs[i] = (detections, per_source_latency)
+
+        return outputs
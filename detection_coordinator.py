@@ -0,0 +1,139 @@
+# Runs several detectors on the same frames with each model run only once, and hands out
+# class-filtered views (person, vehicle, drone, ...) of the results:
+#
+#     coordinator = DetectionCoordinator({'coco': coco_detector, 'drone': drone_detector},
+#                                        {'person': ('coco', [0], 0.5),
+#                                         'vehicle': ('coco', [2, 3, 5, 7], 0.4),
+#                                         'drone': ('drone', None, 0.4)})
+#     views = coordinator.detect(frame)  # {'person': (N, 6) rows, 'vehicle': ..., 'drone': ...}
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from onnx_backend import OnnxYoloModel
+
+
+class Detections:
+    """
+    One model's [x1, y1, x2, y2, conf, cls] rows for one frame, sorted by class and then
+    by descending confidence. Each class is a contiguous block whose rows above any
+    threshold form a prefix, so a view of one class is a slice of `rows` (several
+    classes: one slice per class, concatenated).
+    """
+    def __init__(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        self.rows = rows[np.lexsort((-rows[:, 4], rows[:, 5]))]
+        self.class_ids, self.starts = np.unique(self.rows[:, 5].astype(np.int64), return_index=True)
+        self.ends = np.append(self.starts[1:], len(self.rows))
+
+    def select(self, classes=None, conf=0.0):
+        """Rows of `classes` (None = all) with confidence above `conf`."""
+        if classes is None:
+            indices = range(len(self.class_ids))
+        else:
+            wanted = np.unique(classes)
+            indices = np.searchsorted(self.class_ids, wanted).clip(max=max(len(self.class_ids) - 1, 0))
+            indices = indices[self.class_ids[indices] == wanted] if len(self.class_ids) else []
+        parts = []
+        for i in indices:
+            start, end = self.starts[i], self.ends[i]
+            # Confidences descend within the block: count the rows above the threshold
+            count = np.searchsorted(-self.rows[start:end, 4], -conf, side='left')
+            if count:
+                parts.append(self.rows[start:start + count])
+        if not parts:
+            return self.rows[:0]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class DetectionCoordinator:
+    """
+    `detectors`: {name: Detector} (e.g. the COCO Detector and a DroneDetector).
+    `views`: {view name: (detector name, classes or None for all, min confidence)}.
+
+    Each detector's model runs once per frame, with the lowest threshold and the union of
+    the classes its views ask for; views are then cut out of that single result.
+    ONNX models with the same input size share one letterbox + normalise pass, and the
+    models run concurrently on a thread pool (ONNX Runtime and PyTorch release the GIL
+    while inferring).
+    """
+    def __init__(self, detectors, views, max_workers=None):
+        self.detectors = detectors
+        self.views = views
+        self.requests = {} # detector name -> (confidence, classes) it is run with
+        for name in detectors:
+            wanted = [(classes, conf) for detector_name, classes, conf in views.values() if detector_name == name]
+            if not wanted:
+                continue # No view uses it
+            classes = None if any(c is None for c, _ in wanted) else sorted({c for cs, _ in wanted for c in cs})
+            self.requests[name] = (min(conf for _, conf in wanted), classes)
+        unknown = {detector_name for detector_name, _, _ in views.values()} - set(detectors)
+        if unknown:
+            raise ValueError(f"Views refer to unknown detectors: {sorted(unknown)}")
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.requests), 1),
+                                           thread_name_prefix='detect')
+        self.latency = {} # detector name -> last inference time in ms (excluding shared preprocessing)
+
+    def class_names(self, view):
+        return self.detectors[self.views[view][0]].class_names
+
+    def _infer(self, name, model, prepared, frames, imgsz):
+        """Runs one detector on `frames`; `prepared` is a shared (input tensor, transforms) for ONNX models."""
+        detector = self.detectors[name]
+        conf, classes = self.requests[name]
+        start_time = time.perf_counter()
+        try:
+            if prepared is not None:
+                input_tensor, transforms = prepared
+                iou = detector.config['processing']['iou_threshold']
+                results = model.infer(input_tensor, [frame.shape[:2] for frame in frames], transforms,
+                                      conf=conf, iou=iou, classes=classes)
+            else:
+                results = detector._run_model(model, frames, imgsz, confidence_threshold=conf,
+                                              detection_classes=classes)
+        except Exception as e:
+            print(f"Error during detection ({name}): {e}")
+            results = [[] for _ in frames]
+        self.latency[name] = (time.perf_counter() - start_time) * 1000
+        return results
+
+    def detect_batch(self, frames, is_thermal=False, imgsz=None):
+        """Runs every detector once over `frames`; returns one {view: rows} dict per frame."""
+        models = {}
+        for name in self.requests:
+            detector = self.detectors[name]
+            model = detector.model_thermal if is_thermal else detector.model_rgb
+            if model is not None:
+                models[name] = model
+
+        # ONNX models that take the same input share one preprocessing pass (when the frames fit in one batch)
+        prepared = {}
+        groups = {}
+        for name, model in models.items():
+            if isinstance(model, OnnxYoloModel):
+                batch_size, input_hw = model.batch_key(len(frames), imgsz)
+                if batch_size >= len(frames):
+                    groups.setdefault((batch_size, input_hw), []).append(name)
+        for (_, input_hw), names in groups.items():
+            shared = models[names[0]].prepare(frames, input_hw)
+            for name in names:
+                prepared[name] = shared
+
+        futures = {name: self.executor.submit(self._infer, name, model, prepared.get(name), frames, imgsz)
+                   for name, model in models.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+        outputs = []
+        for i in range(len(frames)):
+            detections = {name: Detections(rows[i]) for name, rows in results.items()}
+            empty = np.empty((0, 6), dtype=np.float32)
+            outputs.append({view: detections[name].select(classes, conf) if name in detections else empty
+                            for view, (name, classes, conf) in self.views.items()})
+        return outputs
+
+    def detect(self, frame, is_thermal=False, imgsz=None):
+        """{view: (N, 6) rows} for a single frame."""
+        return self.detect_batch([frame], is_thermal, imgsz)[0]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
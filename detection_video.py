@@ -1,14 +1,14 @@
 import cv2
-import tempfile
-import os
-from ultralytics import YOLO
-from inference_sdk import InferenceHTTPClient
+from detection import Detector
+from detection_coordinator import DetectionCoordinator
+from drone_detection import DroneDetector
 
 # ---------------- CONFIG ----------------
 YOLO_MODEL_PATH = "yolov8n.pt"
-ROBOFLOW_API_KEY = "tm3sZ8ebG8ZjGyKa8nZV"
-ROBOFLOW_MODEL_ID = "drones_new/3"
+DRONE_MODEL_PATH = "models/drones.onnx" # Local ONNX or NCNN export of the drones_new/3 model
+DRONE_CONFIDENCE = 0.40
 FRAME_RESIZE = (640, 480)
+DEVICE = "cpu"  # or a GPU index, e.g. 0
 VIDEO_PATH = r"D:\codes\python\youtube_vRDvEsKP9iM_1280x720_h264.mp4"
 # ----------------------------------------
 
@@ -16,13 +16,18 @@ PERSON_CLASS = 0
 VEHICLE_CLASSES = [2, 3, 5, 7]  # Car, Motorcycle, Bus, Truck
 
 # Load YOLOv8 model
-yolo_model = YOLO(YOLO_MODEL_PATH)
+yolo_detector = Detector(YOLO_MODEL_PATH, None, device=DEVICE, config={
+    'processing': {'confidence_threshold': 0.4, 'iou_threshold': 0.5, 'detection_classes': None}})
 
-# Initialize Roboflow client
-rf_client = InferenceHTTPClient(
-    api_url="https://detect.roboflow.com",
-    api_key=ROBOFLOW_API_KEY
-)
+# Local drone detector (no network round trip or temp file per frame)
+drone_detector = DroneDetector(DRONE_MODEL_PATH, device=DEVICE, confidence=DRONE_CONFIDENCE)
+
+# Runs each model once per frame (concurrently) and slices out the views
+coordinator = DetectionCoordinator(
+    {'coco': yolo_detector, 'drone': drone_detector},
+    {'person': ('coco', [PERSON_CLASS], 0.5),
+     'vehicle': ('coco', VEHICLE_CLASSES, 0.4),
+     'drone': ('drone', None, DRONE_CONFIDENCE)})
 
 # Open video
 cap = cv2.VideoCapture(VIDEO_PATH)
@@ -40,58 +45,23 @@ while True:
 
     frame = cv2.resize(frame, FRAME_RESIZE)
 
-    # --- YOLOv8 Detection ---
-    results = yolo_model(frame)
-    for result in results:
-        for box in result.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = box.conf[0].item()
-            cls = int(box.cls[0].item())
-            label = yolo_model.names[cls]
-
-            if cls == PERSON_CLASS and conf > 0.5:
-                color = (0, 255, 0)
-                text = f"Person {conf:.2f}"
-            elif cls in VEHICLE_CLASSES and conf > 0.4:
-                color = (255, 165, 0)
-                text = f"{label} {conf:.2f}"
-            else:
-                continue
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, text, (x1, y1 - 5),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # --- Roboflow Drone Detection via temporary file ---
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmpfile:
-            temp_path = tmpfile.name
-            cv2.imwrite(temp_path, frame)
-
-        prediction = rf_client.infer(temp_path, model_id=ROBOFLOW_MODEL_ID)
-
-        os.remove(temp_path)  # Clean up
-    except Exception as e:
-        print("❌ Drone prediction error:", e)
-        prediction = {"predictions": []}
-
-    for obj in prediction["predictions"]:
-        x, y = int(obj["x"]), int(obj["y"])
-        w, h = int(obj["width"]), int(obj["height"])
-        conf = float(obj["confidence"])
-        x1 = x - w // 2
-        y1 = y - h // 2
-        x2 = x + w // 2
-        y2 = y + h // 2
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-        cv2.putText(frame, f"Drone {conf:.2f}", (x1, y1 - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+    # --- YOLOv8 + Drone Detection (one pass per model) ---
+    views = coordinator.detect(frame)
+    boxes = [((0, 255, 0), "Person", det) for det in views["person"]]
+    boxes += [((255, 165, 0), yolo_detector.class_names[int(det[5])], det) for det in views["vehicle"]]
+    boxes += [((0, 0, 255), "Drone", det) for det in views["drone"]]
+    for color, label, det in boxes:
+        x1, y1, x2, y2 = map(int, det[:4])
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"{label} {det[4]:.2f}", (x1, y1 - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
     # --- Show Frame ---
     cv2.imshow("🚀 Combined Detection", frame)
     if cv2.waitKey(1) & 0xFF == ord("q"):
         break
 
+coordinator.close()
 cap.release()
 cv2.destroyAllWindows()
 print("✅ Detection stopped.")
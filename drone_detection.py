@@ -0,0 +1,123 @@
+# Local drone detection: an exported drone model (ONNX, or an ultralytics export such as
+# an NCNN model directory) run through the batched Detector, with frames passed in memory.
+#
+# It replaces the per-frame Roboflow HTTP calls of combined.py / detection_video.py and
+# works offline. For code that still speaks the Roboflow hosted API (e.g. integration tests
+# using inference_sdk.InferenceHTTPClient), the same model can be served locally:
+#
+#     python drone_detection.py --model models/drones.onnx --port 9001
+#     CLIENT = InferenceHTTPClient(api_url="http://localhost:9001", api_key="local")
+import argparse
+import base64
+import json
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import cv2
+import numpy as np
+from detection import Detector
+
+
+class DroneDetector(Detector):
+    """
+    A Detector holding a single drone model for RGB frames (thermal frames get no
+    detections). `predict` / `predict_batch` return [x1, y1, x2, y2, conf, cls] rows
+    like the main detector.
+    Thresholds come from `confidence_threshold` / `iou_threshold` in config.yaml unless
+    `confidence` is given.
+    """
+    def __init__(self, model_path, device='cpu', config=None, confidence=None):
+        self.device = device
+        processing = dict((config or {}).get('processing', {}))
+        processing.update(confidence_threshold=confidence or processing.get('confidence_threshold', 0.40),
+                          iou_threshold=processing.get('iou_threshold', 0.50),
+                          detection_classes=None) # Every class of the drone model
+        self.config = dict(config or {}, processing=processing)
+
+        self.model_rgb = self._load_model(model_path)
+        self.model_thermal = None
+        self.class_names = self.model_rgb.names if self.model_rgb and self.model_rgb.names else {0: 'drone'}
+        print(f"Drone detector initialized on device: {self.device}, model: {model_path}")
+
+
+def to_roboflow(detections, class_names, frame_shape):
+    """Detection rows -> the Roboflow hosted API response (center x/y, width, height)."""
+    predictions = []
+    for x1, y1, x2, y2, conf, cls in np.asarray(detections, dtype=np.float32).reshape(-1, 6).tolist():
+        predictions.append({'x': (x1 + x2) / 2, 'y': (y1 + y2) / 2, 'width': x2 - x1, 'height': y2 - y1,
+                            'confidence': conf, 'class': class_names.get(int(cls), str(int(cls))),
+                            'class_id': int(cls)})
+    return {'image': {'width': frame_shape[1], 'height': frame_shape[0]}, 'predictions': predictions}
+
+
+def _decode_image(body, content_type):
+    """Request body -> BGR frame. Roboflow clients post the base64 JPEG as the form body."""
+    data = body
+    if not content_type.startswith('image/'):
+        data = base64.b64decode(body.strip())
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_server(detector, host='127.0.0.1', port=9001):
+    """
+    HTTP server answering `POST /<project>/<version>?api_key=...&confidence=...` like
+    detect.roboflow.com, using `detector` for every model id. Requests are handled one
+    at a time (the detector's buffers are shared).
+    """
+    default_confidence = detector.config['processing']['confidence_threshold']
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            start_time = time.perf_counter()
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                frame = _decode_image(body, self.headers.get('Content-Type', ''))
+            except ValueError:
+                frame = None
+            if frame is None:
+                self._reply(400, {'error': 'Could not decode the image'})
+                return
+
+            # The hosted API takes percentages (confidence=40); accept fractions too
+            confidence = float(params.get('confidence', [default_confidence])[0])
+            detector.config['processing']['confidence_threshold'] = confidence / 100 if confidence > 1 else confidence
+            try:
+                detections, _ = detector.predict(frame)
+            finally:
+                detector.config['processing']['confidence_threshold'] = default_confidence
+            response = to_roboflow(detections, detector.class_names, frame.shape)
+            response['time'] = time.perf_counter() - start_time
+            self._reply(200, response)
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass # One line per frame would flood the console
+
+    return HTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local drone model behind a Roboflow-compatible HTTP API")
+    parser.add_argument('--model', required=True, help="Drone model: .onnx, .pt or an exported model directory")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--confidence', type=float, default=None, help="Default confidence threshold (0-1)")
+    args = parser.parse_args()
+
+    server = make_server(DroneDetector(args.model, confidence=args.confidence), args.host, args.port)
+    print(f"Drone detection server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
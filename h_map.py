@@ -1,6 +1,6 @@
 import cv2
-import numpy as np
 from ultralytics import YOLO
+from heatmap import BoxSource, HeatmapAccumulator
 
 # ---------------- CONFIG ----------------
 VIDEO_PATH = "python/youtube_vRDvEsKP9iM_1280x720_h264.mp4"           # Set your video path here
@@ -19,8 +19,8 @@ if not cap.isOpened():
     print("❌ Failed to open video.")
     exit()
 
-# Create heatmap accumulator
-heatmap_accumulator = np.zeros(FRAME_RESIZE[::-1], dtype=np.float32)
+# Create heatmap accumulator (detection boxes are painted at full heat, then fade)
+heatmap = HeatmapAccumulator(FRAME_RESIZE[::-1], source=BoxSource(value=255), decay=HEAT_DECAY)
 
 print("🔥 Generating heatmap from video... Press 'q' to stop.")
 
@@ -35,31 +35,12 @@ while True:
     # Run YOLO detection
     results = model(frame, verbose=False)[0]
 
-    # Apply heat to detected areas
-    for box in results.boxes:
-        conf = float(box.conf[0])
-        if conf < CONF_THRESHOLD:
-            continue
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        # Draw a filled white rectangle in the heatmap
-        cv2.rectangle(heatmap_accumulator, (x1, y1), (x2, y2), 255, -1)
+    # Apply heat to detected areas, then decay to allow fading of older detections
+    boxes = results.boxes.data.cpu().numpy()
+    heatmap.update(boxes[boxes[:, 4] >= CONF_THRESHOLD])
 
-    # Apply decay to allow fading of older detections
-    heatmap_accumulator *= HEAT_DECAY
-    heatmap_accumulator = np.clip(heatmap_accumulator, 0, 255)
-
-    # Normalize and convert to 8-bit grayscale
-    normalized_heatmap = cv2.normalize(heatmap_accumulator, None, 0, 255, cv2.NORM_MINMAX)
-    heatmap_uint8 = normalized_heatmap.astype(np.uint8)
-
-    # Convert to colormap (yellow for hot, greenish for cold)
-    colored_heatmap = cv2.applyColorMap(heatmap_uint8, cv2.COLORMAP_JET)
-
-    # Resize again to ensure exact match
-    colored_heatmap = cv2.resize(colored_heatmap, (frame.shape[1], frame.shape[0]))
-
-    # Blend heatmap on top of original frame
-    blended = cv2.addWeighted(frame, 0.5, colored_heatmap, 0.5, 0)
+    # Blend heatmap (JET colormap, normalized) on top of original frame
+    blended = heatmap.overlay(frame, alpha=0.5)
 
     # Show result
     cv2.imshow("📍 Heatmap Overlay", blended)
@@ -1,6 +1,6 @@
 import cv2
-import numpy as np
 from ultralytics import YOLO
+from heatmap import BoxSource, HeatmapAccumulator, two_tone_colormap
 
 # ---------------- CONFIG ----------------
 YOLO_MODEL_PATH = "yolov8n.pt"
@@ -20,6 +20,10 @@ if not cap.isOpened():
     print("❌ Couldn't open video.")
     exit()
 
+# Detected regions yellow, background green; only the current frame's detections count
+heatmap = HeatmapAccumulator(FRAME_RESIZE[::-1], source=BoxSource(value=255, classes=INTEREST_CLASSES),
+                             normalize=False, colormap=two_tone_colormap(cold=(0, 255, 0), hot=(0, 255, 255)))
+
 print("🔥 Generating heatmap. Press 'q' to stop preview...")
 
 while True:
@@ -32,22 +36,12 @@ while True:
     # Run detection
     results = model(frame)[0]
 
-    # Create mask
-    heatmap_mask = np.zeros_like(frame, dtype=np.uint8)
-
-    # Draw yellow boxes (for detections)
-    for box in results.boxes:
-        cls = int(box.cls[0].item())
-        if cls in INTEREST_CLASSES:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cv2.rectangle(heatmap_mask, (x1, y1), (x2, y2), (0, 255, 255), -1)  # Yellow
-
-    # Assign green to background (non-detected regions)
-    green_background = np.full_like(frame, (0, 255, 0))  # Green
-    heatmap = np.where(heatmap_mask.any(axis=2, keepdims=True), heatmap_mask, green_background)
+    # Yellow boxes for detections of interest on a green background
+    heatmap.reset()
+    heatmap.add(results.boxes.data.cpu().numpy())
 
     # Overlay heatmap on frame
-    blended = cv2.addWeighted(frame, 0.4, heatmap, 0.6, 0)
+    blended = heatmap.overlay(frame, alpha=0.6)
 
     cv2.imshow("Heatmap View", blended)
     if cv2.waitKey(1) & 0xFF == ord("q"):
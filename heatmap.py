@@ -0,0 +1,149 @@
+# Activity heatmaps shared by the pipeline (RenderStage) and the stand-alone scripts
+# (h_map.py, live_h_map.py, heat_map.py, backend/process_video.py).
+import cv2
+import numpy as np
+
+
+class BoxSource:
+    """Heat from detection boxes: (N, >=4) xyxy rows. 'set' paints `value`, 'add' adds it."""
+    def __init__(self, value=255.0, mode='set', classes=None):
+        self.value = value
+        self.mode = mode
+        self.classes = classes # Only boxes of these classes (column 5) when given
+
+    def accumulate(self, heat, boxes):
+        boxes = np.asarray(boxes, dtype=np.float32)
+        if boxes.ndim != 2 or not len(boxes):
+            return
+        if self.classes is not None and boxes.shape[1] > 5:
+            boxes = boxes[np.isin(boxes[:, 5].astype(np.int64), self.classes)]
+        for x1, y1, x2, y2 in boxes[:, :4].astype(np.int32).tolist():
+            if self.mode == 'add':
+                roi = heat[max(y1, 0):max(y2 + 1, 0), max(x1, 0):max(x2 + 1, 0)]
+                roi += self.value
+            else:
+                cv2.rectangle(heat, (x1, y1), (x2, y2), self.value, -1)
+
+
+class FootpointSource:
+    """Heat around the bottom center of boxes / tracks (where people stand), added as discs."""
+    def __init__(self, radius=8, value=1.0):
+        self.radius = radius
+        self.value = value
+        self._stamp = None # Disc of `value`, built once
+
+    def accumulate(self, heat, boxes):
+        boxes = np.asarray(boxes, dtype=np.float32)
+        if boxes.ndim != 2 or not len(boxes):
+            return
+        if self._stamp is None:
+            size = 2 * self.radius + 1
+            self._stamp = np.zeros((size, size), dtype=np.float32)
+            cv2.circle(self._stamp, (self.radius, self.radius), self.radius, self.value, -1)
+        h, w = heat.shape
+        r = self.radius
+        xs = ((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32)
+        ys = boxes[:, 3].astype(np.int32)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            # Clip the stamp at the frame border
+            x0, y0, x1, y1 = max(x - r, 0), max(y - r, 0), min(x + r + 1, w), min(y + r + 1, h)
+            if x0 < x1 and y0 < y1:
+                heat[y0:y1, x0:x1] += self._stamp[y0 - (y - r):y1 - (y - r), x0 - (x - r):x1 - (x - r)]
+
+
+class MotionSource:
+    """Heat from moving pixels: frames go through MOG2 background subtraction."""
+    def __init__(self, value=1.0, history=200, var_threshold=25, detect_shadows=True):
+        self.value = value
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=var_threshold,
+                                                             detectShadows=detect_shadows)
+        self._fgmask = None
+
+    def accumulate(self, heat, frame):
+        if self._fgmask is None or self._fgmask.shape != heat.shape:
+            self._fgmask = np.empty(heat.shape, dtype=np.uint8)
+        self.subtractor.apply(frame, fgmask=self._fgmask)
+        # Shadows (127) count as motion, like the original process_video.py
+        cv2.add(heat, self.value, dst=heat, mask=self._fgmask)
+
+
+class HeatmapAccumulator:
+    """
+    A float32 heat image with in-place decay and a pluggable source (BoxSource,
+    FootpointSource, MotionSource or anything with `accumulate(heat, data)`).
+
+    All buffers are allocated once. The colour image is rendered lazily: only when a
+    consumer calls `render` / `overlay`, and only if the heat changed since the last render.
+    """
+    def __init__(self, shape, source=None, decay=1.0, normalize=True, max_value=255.0,
+                 colormap=cv2.COLORMAP_JET):
+        """
+        `shape`: (height, width) of the frames the heat is drawn on.
+        `decay`: factor applied by `decay_step` (1.0 = keep everything, e.g. for totals).
+        `normalize`: stretch min..max to the colormap; otherwise 0..`max_value` maps to it
+        (and the heat is clipped at `max_value`).
+        `colormap`: an OpenCV colormap id or a (256, 1, 3) uint8 lookup table.
+        """
+        self.shape = tuple(shape[:2])
+        self.source = source if source is not None else BoxSource()
+        self.decay = decay
+        self.normalize = normalize
+        self.max_value = max_value
+        self.colormap = colormap
+
+        self.heat = np.zeros(self.shape, dtype=np.float32)
+        self._scaled = np.empty(self.shape, dtype=np.float32)
+        self._gray = np.empty(self.shape, dtype=np.uint8)
+        self._color = np.empty(self.shape + (3,), dtype=np.uint8)
+        self._overlay = np.empty(self.shape + (3,), dtype=np.uint8)
+        self._dirty = True
+
+    def add(self, data, source=None):
+        """Adds heat from one frame's worth of `data` (boxes, tracks, a frame for motion...)."""
+        (source or self.source).accumulate(self.heat, data)
+        if not self.normalize:
+            np.minimum(self.heat, self.max_value, out=self.heat)
+        self._dirty = True
+
+    def decay_step(self):
+        if self.decay != 1.0:
+            np.multiply(self.heat, self.decay, out=self.heat)
+            self._dirty = True
+
+    def update(self, data, source=None):
+        """`add` then `decay_step`: one call per frame for a single source."""
+        self.add(data, source)
+        self.decay_step()
+
+    def reset(self):
+        self.heat.fill(0)
+        self._dirty = True
+
+    def render(self):
+        """Colour (H, W, 3) image of the current heat; reused until the heat changes."""
+        if self._dirty:
+            if self.normalize:
+                # Normalised in float and truncated, as the scripts did (a CV_8U output would round instead)
+                cv2.normalize(self.heat, self._scaled, 0, 255, cv2.NORM_MINMAX)
+                np.copyto(self._gray, self._scaled, casting='unsafe')
+            else:
+                cv2.convertScaleAbs(self.heat, self._gray, alpha=255.0 / self.max_value)
+            cv2.applyColorMap(self._gray, self.colormap, dst=self._color)
+            self._dirty = False
+        return self._color
+
+    def overlay(self, frame, alpha=0.5, dst=None):
+        """Blends the heatmap onto `frame` (same size as the accumulator) into `dst` or an internal buffer."""
+        if frame.shape[:2] != self.shape:
+            raise ValueError(f"Frame size {frame.shape[:2]} does not match the heatmap size {self.shape}")
+        dst = self._overlay if dst is None else dst
+        cv2.addWeighted(frame, 1.0 - alpha, self.render(), alpha, 0, dst=dst)
+        return dst
+
+
+def two_tone_colormap(cold=(0, 255, 0), hot=(0, 255, 255)):
+    """Lookup table for `colormap`: 0 -> `cold`, anything above -> `hot` (BGR)."""
+    lut = np.empty((256, 1, 3), dtype=np.uint8)
+    lut[:] = hot
+    lut[0] = cold
+    return lut
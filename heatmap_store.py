@@ -0,0 +1,267 @@
+"""
+Long-horizon activity heatmaps per camera, persisted as time-bucketed grids.
+
+Every camera gets a coarse grid (e.g. 64 x 48 cells). For each minute, hour and day the
+store keeps the occupancy rate of every cell: the fraction of frames in which a tracked
+object stood in it. Each level is a ring of buckets in a memory-mapped file
+(float16, or uint16 scaled to 0..1); hours and days are aggregated while recording, so a
+query sums a handful of precomputed buckets instead of replaying video. Hours and days
+follow the camera's local time (the UTC offset is fixed when the store is created):
+
+    python heatmap_store.py --dir heatmaps --camera CAM-001 --last 24h --hours 20-6 --output night.png
+"""
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+
+# (name, bucket length in seconds, buckets kept)
+LEVELS = (('minute', 60, 24 * 60), ('hour', 3600, 31 * 24), ('day', 86400, 366))
+_INDEX_DTYPE = np.dtype([('start', '<i8'), ('frames', '<u4')]) # Bucket start (epoch s), frames recorded
+
+
+class _Level:
+    """One ring of buckets: (n, gh, gw) rates plus an index of bucket start times and frame counts."""
+    def __init__(self, directory, name, seconds, size, grid_shape, dtype):
+        self.name = name
+        self.seconds = seconds
+        self.size = size
+        self.dtype = np.dtype(dtype)
+        path = os.path.join(directory, f"{name}.heat")
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        self.rates = np.memmap(path, dtype=self.dtype, mode=mode, shape=(size,) + grid_shape)
+        self.index = np.memmap(os.path.join(directory, f"{name}.index"), dtype=_INDEX_DTYPE, mode=mode, shape=(size,))
+        if mode == 'w+':
+            self.index['start'] = -1 # Empty bucket
+
+        # The open bucket, accumulated in memory: per-cell hit counts over `frames` frames
+        self.start = None
+        self.hits = np.zeros(grid_shape, dtype=np.float64)
+        self.frames = 0
+
+    def _slot(self, start):
+        return (start // self.seconds) % self.size
+
+    def bucket(self, start):
+        """(rates as float32, frames) of the bucket starting at `start`, or None if not stored."""
+        slot = self._slot(start)
+        if self.index['start'][slot] != start:
+            return None
+        rates = self.rates[slot]
+        if self.dtype == np.uint16:
+            rates = rates.astype(np.float32) / 65535.0
+        return np.asarray(rates, dtype=np.float32), int(self.index['frames'][slot])
+
+    def open(self, start):
+        """Starts accumulating the bucket at `start`, resuming it if it was already (partly) written."""
+        self.start = start
+        stored = self.bucket(start)
+        if stored is not None:
+            rates, frames = stored
+            self.hits[:] = rates * frames
+            self.frames = frames
+        else:
+            self.hits.fill(0)
+            self.frames = 0
+
+    def write(self):
+        """Stores the open bucket (as rates) in its ring slot."""
+        if self.start is None or not self.frames:
+            return
+        slot = self._slot(self.start)
+        rates = self.hits / self.frames
+        if self.dtype == np.uint16:
+            self.rates[slot] = np.round(rates.clip(0, 1) * 65535.0)
+        else:
+            self.rates[slot] = rates
+        self.index[slot] = (self.start, self.frames)
+
+    def flush(self):
+        self.rates.flush()
+        self.index.flush()
+
+
+class HeatmapStore:
+    """
+    Records per-frame object positions of one camera into minute / hour / day buckets
+    stored under `directory/<camera>/`, and answers time-range queries from them.
+    """
+    def __init__(self, directory, camera, grid_shape=(48, 64), dtype='float16', utc_offset=None):
+        """
+        `grid_shape` is (rows, cols); `dtype` is 'float16' or 'uint16' (rate scaled to 0..65535).
+        `utc_offset` (seconds east of UTC) is where hour and day buckets start and which hour
+        of day `query(hours=...)` filters on; default: the host's offset when the store is
+        created. It is kept in meta.json, so buckets stay aligned across DST changes.
+        """
+        if np.dtype(dtype) not in (np.float16, np.uint16):
+            raise ValueError(f"Unsupported heatmap store dtype '{dtype}' (use float16 or uint16)")
+        self.camera = camera
+        self.directory = os.path.join(directory, camera)
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta_path = os.path.join(self.directory, 'meta.json')
+        meta = {'grid_shape': list(grid_shape), 'dtype': str(np.dtype(dtype)),
+                'levels': [[name, seconds, size] for name, seconds, size in LEVELS]}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)
+            stored_offset = stored.pop('utc_offset', 0)
+            if stored != meta or utc_offset not in (None, stored_offset):
+                raise ValueError(f"Heatmap store {self.directory} was created with {stored} "
+                                 f"(utc_offset {stored_offset}), not {meta} (utc_offset {utc_offset})")
+            utc_offset = stored_offset
+        else:
+            if utc_offset is None:
+                utc_offset = time.localtime().tm_gmtoff
+            with open(meta_path, 'w') as f:
+                json.dump(dict(meta, utc_offset=utc_offset), f)
+
+        self.utc_offset = int(utc_offset)
+        self.grid_shape = tuple(grid_shape)
+        self.levels = [_Level(self.directory, name, seconds, size, self.grid_shape, dtype)
+                       for name, seconds, size in LEVELS]
+        self._frame_hits = np.zeros(self.grid_shape, dtype=np.float64)
+
+    def record(self, boxes, frame_shape, timestamp=None):
+        """
+        Adds one processed frame: the bottom center (foot point) of each (N, >=4) xyxy box
+        marks its grid cell as occupied. Buckets are written when they close.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        rows, cols = self.grid_shape
+        self._frame_hits.fill(0)
+        boxes = np.asarray(boxes, dtype=np.float32)
+        if boxes.ndim == 2 and len(boxes):
+            h, w = frame_shape[:2]
+            x = ((boxes[:, 0] + boxes[:, 2]) / 2 * cols / w).astype(np.int64).clip(0, cols - 1)
+            y = (boxes[:, 3] * rows / h).astype(np.int64).clip(0, rows - 1)
+            self._frame_hits.flat[y * cols + x] = 1 # Occupied or not, however many objects
+
+        # Open every level's bucket first: a coarser bucket rebuilt on open folds in the finer
+        # open bucket, which must not hold this frame yet
+        for level_index, level in enumerate(self.levels):
+            start = self._bucket_start(timestamp, level.seconds)
+            if level.start != start:
+                if level.start is not None:
+                    level.write()
+                    level.flush()
+                self._open(level_index, start)
+        for level in self.levels:
+            level.hits += self._frame_hits
+            level.frames += 1
+
+    def _bucket_start(self, t, seconds):
+        """Start (epoch seconds) of the `seconds`-long bucket holding `t`, aligned to local time."""
+        return (int(t) + self.utc_offset) // seconds * seconds - self.utc_offset
+
+    def _open(self, level_index, start):
+        """
+        Opens the bucket at `start` on a level. An hour or day bucket is only stored when it
+        closes (or on flush), so after a restart its stored copy, if any, misses the frames
+        the finer buckets got before: it is rebuilt from those when they hold more frames.
+        The finer level's open bucket (e.g. the current hour, itself just rebuilt from its
+        minutes) is taken from memory, as it has not been stored yet.
+        """
+        level = self.levels[level_index]
+        level.open(start)
+        if level_index == 0:
+            return
+        finer = self.levels[level_index - 1]
+        hits = np.zeros(self.grid_shape, dtype=np.float64)
+        frames = 0
+        for sub in range(start, start + level.seconds, finer.seconds):
+            if sub == finer.start:
+                hits += finer.hits
+                frames += finer.frames
+                continue
+            for rates, count in self._buckets(level_index - 1, sub):
+                hits += rates * count
+                frames += count
+        if frames > level.frames:
+            level.hits[:] = hits
+            level.frames = frames
+
+    def flush(self):
+        """Writes the open (partial) buckets, e.g. on shutdown; recording later resumes them."""
+        for level in self.levels:
+            level.write()
+            level.flush()
+
+    def _buckets(self, level_index, t):
+        """Bucket at `t` on a level, or the finer buckets it is made of if it was not stored."""
+        level = self.levels[level_index]
+        bucket = level.bucket(t)
+        if bucket is not None:
+            return [bucket]
+        if level_index == 0:
+            return []
+        # Not aggregated, e.g. the recorder stopped without flushing: fall back to the level below
+        finer = self.levels[level_index - 1].seconds
+        return [b for sub in range(t, t + level.seconds, finer) for b in self._buckets(level_index - 1, sub)]
+
+    def query(self, start, end, hours=None):
+        """
+        Mean occupancy rate per cell over [start, end) (epoch seconds) and the number of
+        frames it covers. `hours` optionally keeps only those hours of the day, in the
+        store's local time (e.g. set(range(20, 24)) | set(range(0, 6)) for nights).
+        The range is covered greedily with the largest buckets that fit in it.
+        """
+        self.flush() # Include the buckets still being recorded
+        minute, hour, day = self.levels
+        total = np.zeros(self.grid_shape, dtype=np.float64)
+        frames = 0
+        t = self._bucket_start(start, minute.seconds)
+        while t < end:
+            local = t + self.utc_offset # Bucket boundaries and hours of day are in local time
+            if hours is None and local % day.seconds == 0 and t + day.seconds <= end:
+                level_index = 2
+            elif local % hour.seconds == 0 and t + hour.seconds <= end:
+                level_index = 1
+            else:
+                level_index = 0
+            if hours is None or local // hour.seconds % 24 in hours:
+                for rates, count in self._buckets(level_index, t):
+                    total += rates * count
+                    frames += count
+            t += self.levels[level_index].seconds
+        return (total / frames if frames else total).astype(np.float32), frames
+
+
+def _parse_duration(text):
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    return int(float(text[:-1]) * units[text[-1]]) if text[-1] in units else int(text)
+
+
+def _parse_hours(text):
+    """'20-6' -> {20, 21, 22, 23, 0, ..., 5}; '9,12,17' -> {9, 12, 17}."""
+    if '-' in text:
+        first, last = (int(v) for v in text.split('-'))
+        return {h % 24 for h in range(first, last + (24 if last <= first else 0))}
+    return {int(v) for v in text.split(',')}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query persisted activity heatmaps")
+    parser.add_argument('--dir', default='heatmaps', help="heatmap_store_dir from config.yaml")
+    parser.add_argument('--camera', required=True, help="Source name, e.g. CAM-001")
+    parser.add_argument('--last', default='24h', help="Time range ending now, e.g. 90m, 24h, 7d")
+    parser.add_argument('--hours', default=None, help="Hours of day to keep (the store's local time), e.g. 20-6 or 9,12,17")
+    parser.add_argument('--output', default=None, help="Write a colour heatmap image (e.g. night.png)")
+    parser.add_argument('--size', default='640x480', help="Output image size WxH")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.dir, args.camera, 'meta.json')) as f:
+        meta = json.load(f)
+    store = HeatmapStore(args.dir, args.camera, tuple(meta['grid_shape']), meta['dtype'])
+    now = time.time()
+    grid, frames = store.query(now - _parse_duration(args.last), now,
+                               _parse_hours(args.hours) if args.hours else None)
+    print(f"{args.camera}: {frames} frames, peak occupancy {grid.max():.3f}, mean {grid.mean():.4f}")
+    if args.output:
+        width, height = (int(v) for v in args.size.split('x'))
+        gray = cv2.normalize(grid, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+        cv2.imwrite(args.output, cv2.applyColorMap(cv2.resize(gray, (width, height), interpolation=cv2.INTER_LINEAR),
+                                                   cv2.COLORMAP_JET))
+        print(f"Heatmap written to {args.output}")
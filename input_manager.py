@@ -1,6 +1,279 @@
+import os
 import cv2
 import time
+import queue
 import threading
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from collections import namedtuple
+import numpy as np
+
+
+# frame: read-only view into the ring, frame_id: monotonic per source,
+# timestamp: capture time (time.time()), fps: measured decode rate,
+# dropped: frames decoded but never returned since the previous read
+FramePacket = namedtuple('FramePacket', ['frame', 'frame_id', 'timestamp', 'fps', 'dropped'])
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame slots for one source.
+    The capture thread decodes straight into the next slot (`cap.read(image=slot)`)
+    and publishes it; readers get read-only views of the newest slot, so no frame is
+    copied unless the consumer asks for it. A view stays valid until `num_slots - 1`
+    newer frames have been decoded, after which its slot is reused.
+    """
+    def __init__(self, num_slots=4):
+        self.num_slots = max(2, int(num_slots))
+        self.slots = None # Allocated on the first frame, once the resolution is known
+        self.timestamps = np.zeros(self.num_slots, dtype=np.float64) # Capture time per slot
+        self.seq = 0 # Number of frames published so far
+        self.fps = 0.0 # Exponential moving average of the decode rate
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock) # Notified on every publish
+
+    def next_slot(self):
+        """Returns the slot the writer should decode into next (None until allocated)."""
+        if self.slots is None:
+            return None
+        return self.slots[self.seq % self.num_slots]
+
+    def _allocate(self, shape, dtype):
+        with self.lock:
+            self.slots = np.empty((self.num_slots,) + tuple(shape), dtype=dtype)
+
+    def publish(self, frame, timestamp=None):
+        """Makes `frame` (normally the slot returned by `next_slot`) the newest frame."""
+        if timestamp is None:
+            timestamp = time.time()
+        if self.slots is None or self.slots.shape[1:] != frame.shape or self.slots.dtype != frame.dtype:
+            self._allocate(frame.shape, frame.dtype) # First frame or resolution change
+        slot = self.slots[self.seq % self.num_slots]
+        if not np.shares_memory(frame, slot):
+            # The decoder could not write in place (e.g. first frame); copy once into the ring
+            np.copyto(slot, frame)
+        self.commit(timestamp)
+
+    def attach(self, buffer, shape, dtype):
+        """Uses an external buffer (e.g. shared memory filled by a capture process) as the slots."""
+        with self.lock:
+            self.slots = np.ndarray((self.num_slots,) + tuple(shape), dtype=dtype, buffer=buffer)
+
+    def commit(self, timestamp, seq=None):
+        """Marks the slot for frame `seq` (default: the next one) as written and wakes up readers."""
+        with self.lock:
+            if seq is not None:
+                self.seq = seq
+            if self.seq > 0:
+                interval = timestamp - self.timestamps[(self.seq - 1) % self.num_slots]
+                if interval > 0:
+                    instant_fps = 1.0 / interval
+                    self.fps = instant_fps if self.fps == 0.0 else 0.9 * self.fps + 0.1 * instant_fps
+            self.timestamps[self.seq % self.num_slots] = timestamp
+            self.seq += 1
+            self.new_frame.notify_all()
+
+    def latest(self):
+        """Returns (read-only view, frame index, capture timestamp) of the newest frame, or (None, -1, 0.0)."""
+        return self.get(self.seq - 1)
+
+    def get(self, index):
+        """Like latest() for a given frame index; (None, -1, 0.0) if not decoded yet or already overwritten."""
+        with self.lock:
+            # Frame seq - num_slots shares its slot with the frame being decoded right now
+            if index < 0 or index >= self.seq or index <= self.seq - self.num_slots:
+                return None, -1, 0.0
+            view = self.slots[index % self.num_slots].view()
+            timestamp = self.timestamps[index % self.num_slots]
+        view.flags.writeable = False
+        return view, index, timestamp
+
+
+_ffmpeg_env_lock = threading.Lock() # OPENCV_FFMPEG_CAPTURE_OPTIONS is process-wide
+
+
+def _open_params(source_config):
+    """
+    Builds the FFmpeg VideoCapture open parameters (hardware decode, decoder threads) for a source.
+    Webcams do not get them: the V4L2 backend does not implement these parameters, and
+    OpenCV gives up on an open call that leaves parameters unused.
+    """
+    params = []
+    if source_config.get('hw_acceleration', False):
+        params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    if source_config.get('decode_threads'):
+        params += [cv2.CAP_PROP_N_THREADS, int(source_config['decode_threads'])]
+    return params
+
+
+def _open_ffmpeg(uri, source_config):
+    """Opens `uri` with the FFmpeg backend, passing `ffmpeg_options` (e.g. rtsp_transport: tcp) to the demuxer."""
+    options = source_config.get('ffmpeg_options') or {}
+    with _ffmpeg_env_lock:
+        previous = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+        if options:
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = '|'.join(f"{key};{value}" for key, value in options.items())
+        try:
+            return cv2.VideoCapture(str(uri), cv2.CAP_FFMPEG, _open_params(source_config))
+        finally:
+            if options:
+                if previous is None:
+                    del os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS']
+                else:
+                    os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = previous
+
+
+def open_capture(source_config):
+    """Opens a cv2.VideoCapture for one `sources` entry of config.yaml (None for unknown types)."""
+    source_type = source_config.get('type', 'webcam')
+    uri = source_config.get('uri')
+    if source_type == 'webcam':
+        cap = cv2.VideoCapture(int(uri), cv2.CAP_V4L2) # Use V4L2 backend for linux often
+        # Let the camera deliver the target size (and e.g. MJPG) instead of resizing afterwards
+        if source_config.get('fourcc'):
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*source_config['fourcc']))
+        if source_config.get('width') and source_config.get('height'):
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, int(source_config['width']))
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, int(source_config['height']))
+        return cap
+    elif source_type in ('rtsp', 'file'):
+        return _open_ffmpeg(uri, source_config)
+    return None
+
+
+class CaptureDecoder:
+    """
+    Reads frames from an open VideoCapture applying the per-source decode options:
+    `width`/`height` (downscale), `pixel_format` (bgr, rgb, gray) and `decode_every_n`.
+    The result is written into `dst` (a ring slot) when possible.
+    Only webcams can be asked for the target size (open_capture sets CAP_PROP_FRAME_WIDTH/
+    HEIGHT). OpenCV's FFmpeg backend (rtsp, file) has no scaling option, so those frames
+    are still decoded at full resolution, into a reused scratch buffer, and resized from
+    there: `width`/`height` saves the copies and work downstream, not the decode itself.
+    """
+    def __init__(self, cap, source_config):
+        self.cap = cap
+        width, height = source_config.get('width'), source_config.get('height')
+        self.size = (int(width), int(height)) if width and height else None
+        self.pixel_format = str(source_config.get('pixel_format', 'bgr')).lower()
+        if self.pixel_format not in ('bgr', 'rgb', 'gray'):
+            raise ValueError(f"Unknown pixel_format '{self.pixel_format}' (use bgr, rgb or gray)")
+        self.convert_code = {'rgb': cv2.COLOR_BGR2RGB, 'gray': cv2.COLOR_BGR2GRAY}.get(self.pixel_format)
+        self.decode_every_n = max(1, int(source_config.get('decode_every_n', 1)))
+        self.scratch = None # Native-size decode buffer
+        self.resized = None # Downscaled buffer, only needed before a colour conversion
+        self.native_size_ok = False # Set once the source turns out to deliver the target size itself
+
+    def read(self, dst=None):
+        """Returns (grabbed, frame) like cap.read(); `frame` is `dst` when it could be filled in place."""
+        # Skipped frames are only grabbed (demuxed/decoded), never converted or copied out
+        for _ in range(self.decode_every_n - 1):
+            if not self.cap.grab():
+                return False, None
+
+        if self.convert_code is None and (self.size is None or self.native_size_ok):
+            return self.cap.read(image=dst) # Nothing to do: decode straight into the slot
+
+        grabbed, self.scratch = self.cap.read(image=self.scratch)
+        if not grabbed:
+            return False, None
+        frame = self.scratch
+        if self.size is not None and frame.shape[1::-1] != self.size:
+            if self.convert_code is None:
+                return True, cv2.resize(frame, self.size, dst=dst, interpolation=cv2.INTER_AREA)
+            frame = self.resized = cv2.resize(frame, self.size, dst=self.resized, interpolation=cv2.INTER_AREA)
+        elif self.convert_code is None:
+            self.native_size_ok = True # e.g. a webcam that accepted CAP_PROP_FRAME_WIDTH/HEIGHT
+            return True, frame
+        return True, cv2.cvtColor(frame, self.convert_code, dst=dst)
+
+
+def _create_shared_memory(size):
+    """Creates a shared memory block the creating process's resource tracker will not unlink on exit."""
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False) # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        if os.name == 'posix':
+            # Older versions register the block with the tracker under its POSIX name ('/' + name)
+            resource_tracker.unregister('/' + shm.name, 'shared_memory')
+        return shm
+
+
+def _capture_process_main(source_config, num_slots, events, stop_event, committed):
+    """
+    Entry point of a `mode: process` capture worker.
+    Decodes frames into shared-memory slots and posts small messages on `events`:
+    ('init', shm_name, shape, dtype) when the slots are (re)allocated,
+    ('frame', seq, timestamp) per decoded frame and ('eof',) when a file ends.
+    `committed` is the last frame seq the parent has applied to its ring. Frame `seq` reuses
+    the slot of frame `seq - num_slots`, which readers may hold until frame `seq - 1` is
+    committed (see FrameRing); until then the worker drops new frames instead of overwriting it.
+    The parent InputManager owns the shared memory and unlinks it on stop.
+    """
+    name = source_config.get('name', source_config.get('uri'))
+    source_type = source_config.get('type', 'webcam')
+    cap = None
+    decoder = None
+    shm = None
+    slots = None
+    seq = 0
+    try:
+        while not stop_event.is_set():
+            if cap is None or not cap.isOpened():
+                cap = open_capture(source_config)
+                if cap is None or not cap.isOpened():
+                    print(f"Capture process for {name}: cannot open source, retrying in 5 seconds...")
+                    if cap:
+                        cap.release()
+                        cap = None
+                    stop_event.wait(5)
+                    continue
+                decoder = CaptureDecoder(cap, source_config)
+
+            busy = seq >= num_slots and committed.value < seq - 1
+            if busy:
+                grabbed, frame = cap.grab(), None # Parent is behind: drop this frame, keep the stream flowing
+            else:
+                slot = slots[seq % num_slots] if slots is not None else None
+                grabbed, frame = decoder.read(slot) # Decode (and downscale) straight into shared memory
+            if not grabbed:
+                if source_type == 'file':
+                    events.put(('eof',))
+                    break
+                cap.release()
+                cap = None # Trigger reconnect
+                stop_event.wait(1)
+                continue
+            if busy:
+                continue
+
+            if slots is None or slots.shape[1:] != frame.shape or slots.dtype != frame.dtype:
+                # First frame or resolution change: allocate a new shared block for the slots
+                del slot, slots
+                if shm is not None:
+                    shm.close()
+                shm = _create_shared_memory(num_slots * frame.nbytes) # Cleanup is the parent's job
+                slots = np.ndarray((num_slots,) + frame.shape, dtype=frame.dtype, buffer=shm.buf)
+                events.put(('init', shm.name, frame.shape, frame.dtype.str)) # Must not be dropped
+                slot = slots[seq % num_slots]
+            if not np.shares_memory(frame, slot):
+                np.copyto(slot, frame)
+
+            try:
+                events.put_nowait(('frame', seq, time.time()))
+            except queue.Full:
+                continue # Not published: the next frame reuses the slot
+            seq += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cap:
+            cap.release()
+        slot = slots = frame = None
+        if shm is not None:
+            shm.close()
+
 
 class InputManager:
     def __init__(self, source_config):
@@ -9,12 +282,22 @@ class InputManager:
         self.uri = source_config.get('uri')
         self.name = source_config.get('name', f"{self.source_type}_{self.uri}")
         self.is_thermal = source_config.get('process_thermal', False)
+        self.mode = source_config.get('mode', 'thread') # 'thread' or 'process'
+        # Lossless sources (files by default) are decoded no faster than they are read, and
+        # readers get every frame in order. Only supported in thread mode.
+        self.lossless = source_config.get('lossless', self.source_type == 'file') and self.mode != 'process'
 
         self.cap = None
+        self.decoder = None
         self.stopped = False
-        self.frame = None
-        self.lock = threading.Lock()
+        self.ring = FrameRing(source_config.get('ring_size', 4))
+        self.last_read_index = -1 # Frame id handed out by the last read_packet() call
         self.thread = None
+
+        if self.mode == 'process':
+             self._start_process()
+             return
+
         self._connect()
 
         if self.cap and self.cap.isOpened():
@@ -34,24 +317,15 @@ class InputManager:
         while attempts < max_retries and self.cap is None:
             try:
                 print(f"Attempting to connect to {self.name} ({self.uri})...")
-                if self.source_type == 'webcam':
-                    self.cap = cv2.VideoCapture(int(self.uri), cv2.CAP_V4L2) # Use V4L2 backend for linux often
-                elif self.source_type == 'rtsp':
-                     # Set environment variable for RTSP TCP transport if needed
-                     # os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'rtsp_transport;tcp'
-                     self.cap = cv2.VideoCapture(str(self.uri), cv2.CAP_FFMPEG)
-                elif self.source_type == 'file':
-                     self.cap = cv2.VideoCapture(str(self.uri))
-                else:
+                self.cap = open_capture(self.source_config)
+                if self.cap is None:
                      print(f"Error: Unknown source type '{self.source_type}' for {self.name}")
                      return
 
                 if not self.cap.isOpened():
                      raise IOError(f"Cannot open video source: {self.uri}")
 
-                # Set properties (optional, might not work for all sources)
-                # self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                # self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+                self.decoder = CaptureDecoder(self.cap, self.source_config)
                 print(f"Successfully connected to {self.name}.")
                 break # Exit loop on success
 
@@ -80,7 +354,16 @@ class InputManager:
                       continue # Skip frame reading
 
 
-            grabbed, frame = self.cap.read()
+            if self.lossless:
+                # Do not overwrite the slot of a frame the reader has not taken yet
+                with self.ring.new_frame:
+                    self.ring.new_frame.wait_for(
+                        lambda: self.ring.seq - self.last_read_index < self.ring.num_slots or self.stopped)
+                if self.stopped:
+                    break
+
+            slot = self.ring.next_slot()
+            grabbed, frame = self.decoder.read(slot) # Decode (and downscale) straight into the ring slot
             if not grabbed:
                 print(f"Warning: Could not grab frame from {self.name}. End of file or stream error?")
                 if self.source_type == 'file': # If it's a file, stop when it ends
@@ -92,27 +375,131 @@ class InputManager:
                      time.sleep(1) # Brief pause before reconnect attempt
                      continue
 
-            with self.lock:
-                self.frame = frame
+            self.ring.publish(frame)
         # Release capture object when stopped
         if self.cap:
             self.cap.release()
         print(f"Stopped video capture thread for: {self.name}")
 
 
+    def _start_process(self):
+        """Spawns a capture process for this source (`mode: process`) and a thread that follows its frames."""
+        ctx = multiprocessing.get_context('spawn') # Do not fork a process that already runs threads
+        # At most two frame messages are in flight (see _capture_process_main), plus 'init'/'eof'
+        self.events = ctx.Queue(maxsize=self.ring.num_slots)
+        self.stop_event = ctx.Event()
+        self.committed = ctx.Value('q', -1, lock=False) # Last frame seq applied to the ring
+        self.shm = None
+        self.retired_shm = []
+        self.process = ctx.Process(target=_capture_process_main, name=f"capture-{self.name}",
+                                   args=(self.source_config, self.ring.num_slots, self.events, self.stop_event,
+                                         self.committed),
+                                   daemon=True)
+        self.process.start()
+        self.thread = threading.Thread(target=self._follow_process, args=(), daemon=True)
+        self.thread.start()
+        print(f"Started capture process (pid {self.process.pid}) for: {self.name}")
+
+
+    def _follow_process(self):
+        """Internal method run by the thread to apply the capture process messages to the ring."""
+        while not self.stopped:
+            try:
+                message = self.events.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    print(f"Capture process for {self.name} exited unexpectedly.")
+                    self.stop()
+                continue
+
+            if message[0] == 'frame':
+                self.ring.commit(message[2], seq=message[1])
+                self.committed.value = message[1] # Frees the slot of frame seq - num_slots + 1 for the worker
+            elif message[0] == 'init':
+                _, shm_name, shape, dtype = message
+                if self.shm is not None:
+                    self.retired_shm.append(self.shm) # Readers may still hold views into it
+                self.shm = shared_memory.SharedMemory(name=shm_name)
+                self.ring.attach(self.shm.buf, shape, np.dtype(dtype))
+            elif message[0] == 'eof':
+                print(f"Warning: Could not grab frame from {self.name}. End of file or stream error?")
+                self.stop()
+
+        self.stop_event.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        for shm in self.retired_shm + ([self.shm] if self.shm is not None else []):
+            shm.unlink()
+            try:
+                shm.close()
+            except BufferError:
+                pass # A consumer still holds a frame view; the mapping goes away with it
+        print(f"Stopped capture process for: {self.name}")
+
+
     def read(self):
-        """Returns the latest frame."""
-        with self.lock:
-            # Return a copy to prevent modification issues if frame is processed elsewhere
-            frame_copy = self.frame.copy() if self.frame is not None else None
-        return frame_copy
+        """Returns a writable copy of the latest frame (for callers that draw on it)."""
+        view, _, _ = self.ring.latest()
+        return view.copy() if view is not None else None
+
+
+    def read_packet(self):
+        """
+        Returns a FramePacket for the newest frame without copying, or None if no frame yet.
+        `packet.frame` is a read-only view into the ring (copy it before drawing on it).
+        Compare `packet.frame_id` with the previous one to detect repeats, or use
+        wait_for_new() to get each frame only once.
+        Lossless sources return the oldest unread frame instead of the newest.
+        """
+        if self.lossless and self.ring.seq - 1 > self.last_read_index:
+            view, index, timestamp = self.ring.get(self.last_read_index + 1)
+        else:
+            view, index, timestamp = self.ring.latest()
+        if view is None:
+            return None
+        if index > self.last_read_index >= 0:
+            dropped = index - self.last_read_index - 1
+        else:
+            dropped = 0
+        self.last_read_index = index
+        if self.lossless:
+            with self.ring.new_frame:
+                self.ring.new_frame.notify_all() # Let the decoder reuse the freed slot
+        return FramePacket(view, index, timestamp, self.ring.fps, dropped)
+
+
+    def read_latest(self):
+        """Returns (frame, frame_index, dropped) without copying; see read_packet()."""
+        packet = self.read_packet()
+        if packet is None:
+            return None, -1, 0
+        return packet.frame, packet.frame_id, packet.dropped
+
+
+    def wait_for_new(self, timeout=None):
+        """
+        Blocks until a frame newer than the last one returned is available and returns its
+        FramePacket. Returns None on timeout or when the source stops, so a pipeline never
+        processes the same frame twice and never spins while the camera is idle.
+        """
+        with self.ring.new_frame:
+            has_new = self.ring.new_frame.wait_for(
+                lambda: self.ring.seq - 1 > self.last_read_index or self.stopped, timeout)
+        if not has_new or self.ring.seq - 1 <= self.last_read_index:
+            return None
+        return self.read_packet()
 
 
     def stop(self):
         """Signals the thread to stop."""
         print(f"Stopping video capture for: {self.name}")
         self.stopped = True
-        if self.thread and self.thread.is_alive():
+        if self.mode == 'process':
+            self.stop_event.set()
+        with self.ring.new_frame:
+            self.ring.new_frame.notify_all() # Wake up readers blocked in wait_for_new()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
              self.thread.join(timeout=2) # Wait for thread to finish
 
 
@@ -0,0 +1,436 @@
+"""
+Border surveillance pipeline entry point.
+
+    python main.py --config config.yaml
+
+Every stage runs in its own thread and talks to the next one through a bounded queue:
+
+    capture (one per source) -> inference -> tracking/behaviour -> rendering -> display
+                                                     \\-> alerts
+
+Live sources drop the oldest queued frame when a stage falls behind; file sources
+block instead so no frame is skipped. A slow stage (drawing, alert I/O) therefore
+never stalls inference.
+"""
+import argparse
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+from config_loader import load_config
+from input_manager import InputManager
+from detection import Detector
+from tracking import Tracker
+from behavior_analysis import BehaviorAnalyzer
+from segmentation import Segmenter
+from heatmap import BoxSource, FootpointSource, HeatmapAccumulator
+from heatmap_store import HeatmapStore
+from scheduler import AdaptiveScheduler
+from roi_tiling import RoiTiler
+from motion_gate import MotionGate, carry_over
+from pipeline import BLOCK, DROP_OLDEST, SourceQueues, Stage, StageQueue, pipeline_drained
+
+
+def source_drop_policy(source_config, pipeline_config):
+    """Drop policy for frames of one source: drop-oldest for live cameras, block for files."""
+    if source_config.get('type') == 'file':
+        return pipeline_config.get('file_drop_policy', BLOCK)
+    return pipeline_config.get('live_drop_policy', DROP_OLDEST)
+
+
+def source_analysis_config(config, source_config):
+    """Per-source copy of the config; a source may override the global `fence_zones`."""
+    source_specific = dict(config)
+    behavior = dict(config['behavior_analysis'])
+    if 'fence_zones' in source_config:
+        behavior['fence_zones'] = source_config['fence_zones']
+    source_specific['behavior_analysis'] = behavior
+    return source_specific
+
+
+class CaptureStage(Stage):
+    """
+    Takes each new frame of one InputManager exactly once and queues it for inference.
+    With a MotionGate, static frames are marked so inference skips them.
+    """
+    def __init__(self, input_manager, scheduler, stop_event, output_queue, policy, motion_gate=None):
+        super().__init__(f"capture-{input_manager.name}", stop_event, output_queue=output_queue)
+        self.input_manager = input_manager
+        self.scheduler = scheduler
+        self.policy = policy
+        self.motion_gate = motion_gate
+
+    def run(self):
+        while not self.stop_event.is_set():
+            packet = self.input_manager.wait_for_new(timeout=0.5)
+            if packet is None:
+                if not self.input_manager.is_running():
+                    break # Source ended (file) or failed for good
+                continue
+            if not self.scheduler.should_process(self.input_manager.name):
+                continue
+            # The ring keeps decoding into this slot while the item waits in the queues (and
+            # may overwrite it mid-inference): every item carries its own copy of the frame
+            frame = packet.frame.copy()
+            infer, regions = True, None
+            if self.motion_gate is not None:
+                infer, regions = self.motion_gate.check(self.input_manager.name, frame, packet.timestamp)
+            self.processed += 1
+            self.emit({
+                'source': self.input_manager.name,
+                'is_thermal': self.input_manager.is_thermal,
+                'frame': frame,
+                'frame_id': packet.frame_id,
+                'timestamp': packet.timestamp,
+                'infer': infer, # False: static frame, reuse the source's last detections
+                'motion_regions': regions, # Restrict inference to these (x0, y0, x1, y1) regions
+                'drop_policy': self.policy, # Applies to every downstream queue this frame goes through
+            }, policy=self.policy)
+        print(f"Stage stopped: {self.name}")
+
+
+class InferenceStage(Stage):
+    """
+    Runs the detector on whatever frames are queued, one batched forward pass per model.
+    With a RoiTiler the batch is made of the fence-zone tiles of those frames instead.
+    Frames it runs are reported to the MotionGate, which times its keep-alive from them.
+    If a batch fails its frames are retried one at a time; a frame that fails on its own
+    goes on with no detections (counted in `failures`) so no frame is lost downstream.
+    """
+    def __init__(self, detector, scheduler, stop_event, input_queue, output_queue, max_batch_size=8, roi_tiler=None,
+                 motion_gate=None):
+        super().__init__("inference", stop_event, input_queue, output_queue)
+        self.detector = detector
+        self.roi_tiler = roi_tiler
+        self.motion_gate = motion_gate
+        self.scheduler = scheduler
+        self.max_batch_size = max_batch_size
+        self.last_detections = {} # source name -> detections, reused for frames the motion gate skipped
+        self.failures = 0 # Frames the detector failed on
+
+    def _predict(self, batch):
+        """(detections, latency_ms) per item; frames skipped by the motion gate are left out (None) of the forward pass."""
+        frames = [b['frame'] if b.get('infer', True) else None for b in batch]
+        is_thermal_flags = [b['is_thermal'] for b in batch]
+        if self.roi_tiler is not None:
+            return self.roi_tiler.predict_batch(frames, is_thermal_flags, [b['source'] for b in batch],
+                                                imgsz=self.scheduler.imgsz,
+                                                regions=[b.get('motion_regions') for b in batch])
+        return self.detector.predict_batch(frames, is_thermal_flags, imgsz=self.scheduler.imgsz)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.idle = True
+            item = self.input_queue.get()
+            if item is None:
+                continue
+            self.idle = False
+            batch = [item]
+            while len(batch) < self.max_batch_size:
+                item = self.input_queue.get_nowait()
+                if item is None:
+                    break
+                batch.append(item)
+
+            start_time = time.perf_counter()
+            try:
+                results = self._predict(batch)
+            except Exception as e:
+                print(f"Error in stage {self.name}: {e}. Retrying the {len(batch)} frames one at a time.")
+                results = []
+                for item in batch:
+                    try:
+                        results += self._predict([item])
+                    except Exception as e:
+                        print(f"Error in stage {self.name} ({item['source']}, frame {item['frame_id']}): {e}")
+                        self.failures += 1
+                        results.append(None)
+            self.busy_time += time.perf_counter() - start_time
+
+            for item, result in zip(batch, results):
+                source = item['source']
+                detections, latency = result if result is not None else (np.empty((0, 6), dtype=np.float32), 0.0)
+                if result is None:
+                    # Failed: no detections for this frame, but it still goes through tracking/rendering
+                    if self.motion_gate is not None and item.get('infer', True):
+                        self.motion_gate.mark_inferred(source, item['timestamp'])
+                elif not item.get('infer', True):
+                    detections = self.last_detections.get(source, detections)
+                else:
+                    if item.get('motion_regions'):
+                        # Objects outside the moving regions were not looked at: keep their last boxes
+                        previous = carry_over(self.last_detections.get(source, []), item['motion_regions'])
+                        detections = np.concatenate((np.asarray(detections, dtype=np.float32).reshape(-1, 6), previous))
+                    self.last_detections[source] = detections
+                    self.scheduler.record(source, latency, item['timestamp'])
+                    if self.motion_gate is not None:
+                        self.motion_gate.mark_inferred(source, item['timestamp'], item.get('motion_regions'))
+                item['detections'] = detections
+                item['latency_ms'] = latency
+                self.processed += 1
+                self.emit(item, policy=item['drop_policy'])
+        print(f"Stage stopped: {self.name}")
+
+
+class BehaviorStage(Stage):
+    """Tracks detections per source, runs behaviour analysis and hands alerts to the alert stage."""
+    def __init__(self, config, stop_event, input_queue, output_queue, alert_queue):
+        super().__init__("behavior", stop_event, input_queue, output_queue)
+        self.config = config
+        self.alert_queue = alert_queue
+        self.trackers = {}
+        self.analyzers = {}
+        self.heatmap_stores = {} # source name -> HeatmapStore (persisted long-term heatmaps)
+        vis = config['visualization']
+        for source_config in config['sources']:
+            name = source_config.get('name', f"{source_config.get('type', 'webcam')}_{source_config.get('uri')}")
+            self.analyzers[name] = BehaviorAnalyzer(source_analysis_config(config, source_config))
+            if vis.get('heatmap_store_dir'):
+                self.heatmap_stores[name] = HeatmapStore(vis['heatmap_store_dir'], name,
+                                                         tuple(vis.get('heatmap_store_grid', (48, 64))),
+                                                         vis.get('heatmap_store_dtype', 'float16'))
+
+    def process(self, item):
+        source = item['source']
+        if source not in self.trackers:
+            self.trackers[source] = Tracker(self.config)
+        tracks = self.trackers[source].update(item['detections'], item['frame'])
+        alerts = self.analyzers[source].update(tracks, item['frame'].shape)
+        if source in self.heatmap_stores:
+            self.heatmap_stores[source].record(tracks, item['frame'].shape, item['timestamp'])
+        for alert in alerts:
+            alert['source'] = source
+            self.alert_queue.put(alert, stop_event=self.stop_event)
+        item['tracks'] = tracks
+        item['behaviors'] = self.analyzers[source].behavior_labels(tracks[:, 4])
+        item['alerts'] = alerts
+        return item if self.output_queue is not None else None
+
+
+class RenderStage(Stage):
+    """Draws detections, tracks and fence zones, writes the output video and feeds the display."""
+    def __init__(self, config, class_names, stop_event, input_queue, output_queue, segmenter=None):
+        super().__init__("render", stop_event, input_queue, output_queue)
+        self.visualization = config['visualization']
+        self.class_names = class_names
+        self.segmenter = segmenter
+        self.fence_zones = {}
+        self.segmented_sources = set() # draw_segmentation, or its per-source override
+        for source_config in config['sources']:
+            name = source_config.get('name', f"{source_config.get('type', 'webcam')}_{source_config.get('uri')}")
+            if source_config.get('draw_segmentation', self.visualization.get('draw_segmentation')):
+                self.segmented_sources.add(name)
+            zones = source_analysis_config(config, source_config)['behavior_analysis'].get('fence_zones') or []
+            self.fence_zones[name] = [np.array(zone, np.int32) for zone in zones]
+        self.multiple_sources = len(config['sources']) > 1
+        self.writers = {} # source name -> cv2.VideoWriter
+        self.heatmaps = {} # source name -> HeatmapAccumulator
+
+    def process(self, item):
+        frame = item['frame']
+        vis = self.visualization
+
+        if item['source'] in self.segmented_sources and self.segmenter is not None and len(item['detections']):
+            masks, _ = self.segmenter.segment_objects(frame, np.asarray(item['detections'])[:, :4], item['source'])
+            frame = self.segmenter.draw_masks(frame, masks, item['detections'])
+        if vis.get('draw_heatmaps'):
+            heatmap = self.heatmaps.get(item['source'])
+            if heatmap is None or heatmap.shape != frame.shape[:2]:
+                source = BoxSource(value=1.0, mode='add') if vis.get('heatmap_source') == 'boxes' else FootpointSource()
+                heatmap = HeatmapAccumulator(frame.shape, source=source, decay=vis.get('heatmap_decay', 0.98))
+                self.heatmaps[item['source']] = heatmap
+            heatmap.update(item['tracks'] if len(item['tracks']) else item['detections'])
+            heatmap.overlay(frame, alpha=vis.get('heatmap_alpha', 0.4), dst=frame)
+        if vis.get('draw_fence_zones', True):
+            cv2.polylines(frame, self.fence_zones.get(item['source'], []), True, (0, 0, 255), 2)
+        if vis.get('draw_detections', True):
+            for x1, y1, x2, y2, conf, cls in np.asarray(item['detections']).reshape(-1, 6):
+                label = f"{self.class_names.get(int(cls), int(cls))} {conf:.2f}"
+                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+                cv2.putText(frame, label, (int(x1), int(y1) - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        if vis.get('draw_tracks', True):
+            for (x1, y1, x2, y2, track_id), behavior in zip(item['tracks'][:, :5], item['behaviors']):
+                label = f"ID:{int(track_id)} {behavior}" if behavior else f"ID:{int(track_id)}"
+                cv2.putText(frame, label, (int(x1), int(y2) + 15),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        for alert in item['alerts']:
+            cv2.putText(frame, f"ALERT: {alert['type']} ID {alert['track_id']}",
+                        (int(alert['position'][0]), int(alert['position'][1])),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
+        if vis.get('output_video_path'):
+            source = item['source']
+            if source not in self.writers:
+                path = vis['output_video_path']
+                if self.multiple_sources: # One file per source, e.g. output/processed_Gate_Camera_RGB.mp4
+                    root, ext = os.path.splitext(path)
+                    path = f"{root}_{source}{ext}"
+                h, w = frame.shape[:2]
+                self.writers[source] = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 20, (w, h))
+            self.writers[source].write(frame)
+
+        item['frame'] = frame
+        return item if self.output_queue is not None else None
+
+
+class AlertStage(Stage):
+    """Delivers alerts (console / SMS / webhook) off the inference path."""
+    def __init__(self, config, stop_event, input_queue):
+        super().__init__("alerts", stop_event, input_queue)
+        self.alerting = config['alerting']
+        self.sms_client = None
+        if self.alerting.get('enable_sms_alerts'):
+            try:
+                from twilio.rest import Client
+                self.sms_client = Client(self.alerting['twilio_sid'], self.alerting['twilio_token'])
+            except ImportError:
+                print("Warning: twilio not installed. SMS alerts disabled.")
+
+    def process(self, alert):
+        message = f"[{alert['source']}] {alert['type']} - track {alert['track_id']} at {alert['position']}"
+        if self.alerting.get('enable_console_alerts', True):
+            print(f"ALERT: {message}")
+        if self.sms_client is not None:
+            self.sms_client.messages.create(body=message, from_=self.alerting['twilio_from'], to=self.alerting['twilio_to'])
+        if self.alerting.get('enable_webhook_alerts'):
+            import requests
+            requests.post(self.alerting['webhook_url'], json={**alert, 'message': message}, timeout=5)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI-powered border surveillance pipeline")
+    parser.add_argument('--config', default='config.yaml', help="Path to config.yaml")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for source_config in config['sources']:
+        # The detector (letterbox), motion gate and rendering all take (H, W, 3) BGR frames
+        if str(source_config.get('pixel_format', 'bgr')).lower() != 'bgr':
+            raise ValueError(f"Source {source_config.get('name', source_config.get('uri'))}: the detection pipeline "
+                             f"needs pixel_format: bgr (got {source_config['pixel_format']})")
+    pipeline_config = config['pipeline']
+    vis = config['visualization']
+    queue_size = pipeline_config.get('queue_size', 2)
+    rendering = bool(vis.get('show_video') or vis.get('output_video_path'))
+
+    device = config['processing'].get('device', 'cpu')
+    detector = Detector(config.get('detection_model_rgb'), config.get('detection_model_thermal'),
+                        device=device, config=config)
+    segmenter = None
+    if any(s.get('draw_segmentation', vis.get('draw_segmentation')) for s in config['sources']):
+        segmenter = Segmenter(config.get('segmentation_model_path'), config.get('segmentation_model_type', 'vit_b'),
+                              device=device, cache_max_delta=config.get('segmentation_cache_max_delta', 2.0),
+                              cache_max_age=config.get('segmentation_cache_max_age', 15))
+    scheduler = AdaptiveScheduler(config)
+    inputs = [InputManager(source_config) for source_config in config['sources']]
+    roi_tiler = None
+    processing = config['processing']
+    if processing.get('roi_tiling'):
+        zones_by_source = {im.name: source_analysis_config(config, im.source_config)['behavior_analysis'].get('fence_zones')
+                           for im in inputs}
+        roi_tiler = RoiTiler(detector, zones_by_source, tile_size=processing.get('roi_tile_size', 640),
+                             overlap=processing.get('roi_tile_overlap', 0.2), margin=processing.get('roi_margin_px', 32),
+                             include_full_frame=processing.get('roi_include_full_frame', True))
+    motion_gate = None
+    if processing.get('motion_gate'):
+        motion_gate = MotionGate(method=processing.get('motion_gate_method', 'mog2'),
+                                 scale=processing.get('motion_gate_scale', 0.25),
+                                 min_area_ratio=processing.get('motion_min_area_ratio', 0.002),
+                                 keepalive_seconds=processing.get('motion_keepalive_seconds', 5),
+                                 regions=processing.get('motion_regions', False),
+                                 region_margin=processing.get('motion_region_margin_px', 32))
+        if motion_gate.regions and roi_tiler is None:
+            roi_tiler = RoiTiler(detector, {}) # Crops the motion regions; other frames run whole
+
+    stop_event = threading.Event()
+    # One frame queue per source: a live camera's drops never touch a file source's frames
+    source_queues = {im.name: StageQueue(f"frames-{im.name}", maxsize=queue_size,
+                                         policy=source_drop_policy(im.source_config, pipeline_config))
+                     for im in inputs}
+    frame_queue = SourceQueues(source_queues.values())
+    if motion_gate is not None:
+        for q in source_queues.values(): # A dropped keep-alive frame is asked for again
+            q.on_drop.append(lambda item: item['infer'] and motion_gate.discard(item['source'], item['timestamp']))
+    detection_queue = StageQueue('detections', maxsize=queue_size, policy=BLOCK)
+    render_queue = StageQueue('render', maxsize=queue_size) if rendering else None
+    display_queue = StageQueue('display', maxsize=2) if vis.get('show_video') else None
+    alert_queue = StageQueue('alerts', maxsize=256, policy=BLOCK)
+
+    stages = [CaptureStage(im, scheduler, stop_event, source_queues[im.name],
+                           source_drop_policy(im.source_config, pipeline_config), motion_gate)
+              for im in inputs]
+    behavior = BehaviorStage(config, stop_event, detection_queue, render_queue, alert_queue)
+    inference = InferenceStage(detector, scheduler, stop_event, frame_queue, detection_queue,
+                               max_batch_size=pipeline_config.get('max_batch_size', 8), roi_tiler=roi_tiler,
+                               motion_gate=motion_gate)
+    stages += [
+        inference,
+        behavior,
+        AlertStage(config, stop_event, alert_queue),
+    ]
+    if rendering:
+        stages.append(RenderStage(config, detector.class_names, stop_event, render_queue, display_queue, segmenter))
+    for stage in stages:
+        stage.start()
+    print("Pipeline started. Press 'q' in a video window or Ctrl+C to stop.")
+
+    last_stats = time.time()
+    try:
+        while True:
+            # cv2.imshow must run on the main thread on several platforms
+            if display_queue is not None:
+                item = display_queue.get(timeout=0.05)
+                if item is not None:
+                    cv2.imshow(item['source'], item['frame'])
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.2)
+
+            captures = [stage for stage in stages if isinstance(stage, CaptureStage)]
+            if not any(stage.is_alive() for stage in captures):
+                # Check twice so an item handed between two stages is not missed
+                queues = [frame_queue, detection_queue, render_queue, alert_queue]
+                workers = [stage for stage in stages if stage not in captures]
+                if pipeline_drained(workers, queues):
+                    time.sleep(0.5)
+                    if pipeline_drained(workers, queues):
+                        print("All sources finished.")
+                        break
+
+            if time.time() - last_stats > 10:
+                last_stats = time.time()
+                print(f"Scheduler: {scheduler.stats()} | dropped frames: {frame_queue.dropped} | "
+                      f"inference failures: {inference.failures}")
+                if roi_tiler is not None:
+                    print(f"ROI tiling: {roi_tiler.stats()}")
+                if motion_gate is not None:
+                    for source, stats in motion_gate.stats().items():
+                        print(f"Motion gate [{source}]: {stats}")
+                if segmenter is not None:
+                    print(f"SAM embeddings: {segmenter.stats()}")
+                for source, analyzer in behavior.analyzers.items():
+                    print(f"Tracks [{source}]: {analyzer.stats()}")
+    except KeyboardInterrupt:
+        print("Interrupted.")
+    finally:
+        stop_event.set()
+        for im in inputs:
+            im.stop()
+        for stage in stages:
+            stage.join(timeout=2)
+        for store in behavior.heatmap_stores.values():
+            store.flush() # Keep the partial minute / hour / day buckets
+        for stage in stages:
+            if isinstance(stage, RenderStage):
+                for writer in stage.writers.values():
+                    writer.release()
+        if display_queue is not None:
+            cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    main()
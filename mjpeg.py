@@ -0,0 +1,115 @@
+# MJPEG (multipart/x-mixed-replace) streaming of the latest processed frame to any
+# number of HTTP viewers, e.g. from a Flask route:
+#
+#     broadcaster = MjpegBroadcaster()
+#     @app.route('/video1')
+#     def video():
+#         return Response(broadcaster.stream(fps=request.args.get('fps', type=float),
+#                                            quality=request.args.get('quality', type=int)),
+#                         mimetype=MJPEG_MIMETYPE)
+#
+#     broadcaster.publish(frame)  # from the frame loop
+import threading
+import time
+import cv2
+import numpy as np
+
+MJPEG_MIMETYPE = 'multipart/x-mixed-replace; boundary=frame'
+_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+
+class MjpegBroadcaster:
+    """
+    Holds the latest frame and hands it to viewers as ready-to-send multipart chunks.
+
+    `publish` copies the frame into a reused buffer and wakes the viewers (condition
+    variable, no polling). Each new frame is JPEG-encoded at most once per quality setting,
+    by whichever viewer needs it first; every other viewer at that quality gets the same
+    bytes. A viewer only ever receives the newest frame when it is ready for one, so slow
+    clients skip frames instead of building a queue.
+    """
+    def __init__(self, fps=15, quality=80, max_fps=30):
+        self.default_fps = fps
+        self.default_quality = quality
+        self.max_fps = max_fps
+        self.condition = threading.Condition()
+        self.frame = None # Reused buffer holding the latest frame
+        self.seq = 0 # Bumped by every publish
+        self.encoded = {} # quality -> (seq, multipart chunk)
+        self.encode_locks = {} # quality -> lock, so concurrent viewers do not encode the same frame twice
+        self.scratch = {} # quality -> reused snapshot buffer the encoder reads from
+        self.running = True
+        self.clients = 0
+        self.encodes = 0
+
+    def publish(self, frame):
+        """Makes `frame` the current frame (copied; the caller may reuse its array)."""
+        with self.condition:
+            if self.frame is None or self.frame.shape != frame.shape or self.frame.dtype != frame.dtype:
+                self.frame = np.empty_like(frame)
+            np.copyto(self.frame, frame)
+            self.seq += 1
+            self.condition.notify_all()
+
+    def _chunk(self, quality):
+        """Multipart chunk of the current frame at `quality`, encoding it if nobody has yet."""
+        with self.condition:
+            lock = self.encode_locks.setdefault(quality, threading.Lock())
+        with lock:
+            with self.condition:
+                seq = self.seq
+                cached = self.encoded.get(quality)
+                if cached is not None and cached[0] == seq:
+                    return seq, cached[1]
+                # Snapshot into a reused buffer and encode outside the condition,
+                # so publish() is never held up by an encode
+                frame = self.scratch.get(quality)
+                if frame is None or frame.shape != self.frame.shape or frame.dtype != self.frame.dtype:
+                    frame = self.scratch[quality] = np.empty_like(self.frame)
+                np.copyto(frame, self.frame)
+            ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            if not ok:
+                return seq, None
+            chunk = b''.join((_PART_HEADER, jpeg.tobytes(), b'\r\n'))
+            self.encodes += 1
+            with self.condition:
+                self.encoded[quality] = (seq, chunk)
+            return seq, chunk
+
+    def stream(self, fps=None, quality=None):
+        """Generator of multipart chunks for one viewer, at most `fps` frames per second."""
+        fps = min(fps or self.default_fps, self.max_fps)
+        quality = int(min(max(quality or self.default_quality, 10), 100))
+        interval = 1.0 / fps
+        last_seq = 0
+        next_time = 0.0
+        with self.condition:
+            self.clients += 1
+        try:
+            while self.running:
+                # Per-client frame rate cap
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                with self.condition:
+                    # Sleep until there is a frame this viewer has not seen
+                    if not self.condition.wait_for(lambda: self.seq != last_seq or not self.running, timeout=5):
+                        continue
+                    if not self.running:
+                        break
+                last_seq, chunk = self._chunk(quality)
+                if chunk is not None:
+                    next_time = time.monotonic() + interval
+                    yield chunk
+        finally:
+            with self.condition:
+                self.clients -= 1
+
+    def stop(self):
+        """Ends every viewer's stream."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def stats(self):
+        return {'clients': self.clients, 'frames': self.seq, 'encodes': self.encodes}
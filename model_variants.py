@@ -0,0 +1,38 @@
+# Names of the reduced-precision model variants written by quantize.py, and how the
+# runtime (Detector, TrackBehaviorClassifier) picks them with `detector_precision` /
+# `behavior_precision`. Kept apart from quantize.py so loading a model does not import
+# the quantization CLI.
+import os
+
+PRECISIONS = ('fp32', 'int8', 'fp16')
+
+# Model kind -> precision -> suffix replacing the file extension
+_SUFFIXES = {
+    'detector': {'int8': '_int8.onnx', # Statically quantized ONNX for ONNX Runtime
+                 'fp16': '_fp16_ncnn_model'}, # NCNN fp16, as used on the Pi in the rpi notebooks
+    'lstm': {'int8': '_int8.pt'}, # Dynamic int8 TorchScript of the behaviour LSTM (.pth, .pt or .onnx)
+}
+
+
+def variant_candidate(path, precision, kind):
+    """Where quantize.py writes the `precision` variant of a `kind` ('detector' or 'lstm') model; None if it has none."""
+    if kind not in _SUFFIXES:
+        raise ValueError(f"Unknown model kind '{kind}' (use {', '.join(_SUFFIXES)})")
+    suffix = _SUFFIXES[kind].get(precision)
+    if suffix is None:
+        return None
+    return os.path.splitext(path.rstrip('/'))[0] + suffix
+
+
+def variant_path(path, precision='fp32', kind='detector'):
+    """
+    Path of the `precision` variant of `path`, or `path` itself for fp32 or when the
+    variant has not been generated.
+    """
+    if not path or not precision or precision == 'fp32':
+        return path
+    candidate = variant_candidate(path, precision, kind)
+    if candidate and os.path.exists(candidate):
+        return candidate
+    print(f"Warning: no {precision} variant of {path} (run quantize.py). Using {path}.")
+    return path
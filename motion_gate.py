@@ -0,0 +1,164 @@
+# Motion gate in front of the detector: a cheap background subtraction on a downscaled
+# copy of each frame decides whether the frame needs inference at all. Static frames
+# (e.g. an empty fence line at night) are skipped, except for a periodic keep-alive
+# inference, and moving frames can be restricted to the regions that moved.
+import cv2
+import numpy as np
+from roi_tiling import merge_rects
+
+
+class _CameraGate:
+    """Per-camera state: background model, reusable small buffers and counters."""
+    def __init__(self, method, history, var_threshold):
+        self.subtractor = None
+        if method == 'mog2':
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=var_threshold,
+                                                                 detectShadows=False)
+        self.small = None
+        self.gray = None
+        self.previous = None # Last gray frame, for frame differencing
+        self.mask = None
+        self.last_inference = None # Capture timestamp of the last frame the detector actually ran on
+        self.keepalive_pending = None # Capture timestamp of a keep-alive frame approved but not inferred yet
+        self.frames = 0
+        self.inferred = 0
+        self.keepalive = 0
+        self.region_frames = 0 # Inferred on motion regions only
+
+
+class MotionGate:
+    """
+    Decides per camera whether a frame goes to the detector.
+
+    Each frame is shrunk by `scale` and compared with the background (MOG2, or the previous
+    frame with `method='diff'`). A frame is inferred when more than `min_area_ratio` of it
+    moved, or when `keepalive_seconds` have passed since the camera's last inference, so
+    objects standing still are still seen now and then. With `regions` the moving blobs
+    are returned as (x0, y0, x1, y1) frame rectangles, grown by `region_margin`; when they
+    cover more than `max_region_ratio` of the frame the whole frame is used instead.
+    One keep-alive frame is in flight at a time: static frames are skipped until the
+    inference stage reports it with `mark_inferred`, or the queue reports it dropped with
+    `discard`, after which the next static frame asks for another. The counters only
+    include frames that were actually inferred.
+    """
+    def __init__(self, method='mog2', scale=0.25, min_area_ratio=0.002, keepalive_seconds=5.0, regions=False,
+                 region_margin=32, max_region_ratio=0.5, history=200, var_threshold=25, diff_threshold=15):
+        if method not in ('mog2', 'diff'):
+            raise ValueError(f"Unknown motion gate method '{method}' (use mog2 or diff)")
+        self.method = method
+        self.scale = scale
+        self.min_area_ratio = min_area_ratio
+        self.keepalive_seconds = keepalive_seconds
+        self.regions = regions
+        self.region_margin = region_margin
+        self.max_region_ratio = max_region_ratio
+        self.history = history
+        self.var_threshold = var_threshold
+        self.diff_threshold = diff_threshold
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        self.cameras = {} # source name -> _CameraGate
+
+    def _motion_mask(self, gate, frame):
+        """Binary mask (on the downscaled frame) of the pixels that moved."""
+        h, w = frame.shape[:2]
+        size = (max(int(w * self.scale), 1), max(int(h * self.scale), 1))
+        if gate.small is None or gate.small.shape[1::-1] != size:
+            gate.small = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+            gate.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+            gate.mask = np.empty((size[1], size[0]), dtype=np.uint8)
+            gate.previous = None
+        cv2.resize(frame, size, dst=gate.small, interpolation=cv2.INTER_AREA)
+
+        if gate.subtractor is not None:
+            gate.subtractor.apply(gate.small, fgmask=gate.mask)
+        else:
+            if gate.small.ndim == 3:
+                cv2.cvtColor(gate.small, cv2.COLOR_BGR2GRAY, dst=gate.gray)
+            else:
+                gate.gray[:] = gate.small
+            cv2.GaussianBlur(gate.gray, (5, 5), 0, dst=gate.gray)
+            if gate.previous is None:
+                gate.previous = gate.gray.copy()
+            cv2.absdiff(gate.gray, gate.previous, dst=gate.mask)
+            gate.previous, gate.gray = gate.gray, gate.previous # Keep this frame; reuse the old buffer next time
+            cv2.threshold(gate.mask, self.diff_threshold, 255, cv2.THRESH_BINARY, dst=gate.mask)
+        cv2.morphologyEx(gate.mask, cv2.MORPH_OPEN, self.kernel, dst=gate.mask) # Drop single-pixel noise
+        return gate.mask
+
+    def _regions(self, mask, frame_shape):
+        """Bounding rectangles of the moving blobs, in frame coordinates, or None for the whole frame."""
+        h, w = frame_shape[:2]
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        rects = []
+        for x, y, bw, bh, _ in stats[1:count].tolist(): # Label 0 is the background
+            rects.append((max(int(x / self.scale) - self.region_margin, 0),
+                          max(int(y / self.scale) - self.region_margin, 0),
+                          min(int((x + bw) / self.scale) + self.region_margin, w),
+                          min(int((y + bh) / self.scale) + self.region_margin, h)))
+        rects = merge_rects(rects)
+        if not rects or sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects) > self.max_region_ratio * w * h:
+            return None
+        return rects
+
+    def check(self, source, frame, timestamp):
+        """
+        Returns (infer, regions) for one frame of `source`: whether to run the detector, and
+        the (x0, y0, x1, y1) regions to restrict it to (None = the whole frame).
+        """
+        gate = self.cameras.get(source)
+        if gate is None:
+            gate = self.cameras[source] = _CameraGate(self.method, self.history, self.var_threshold)
+        gate.frames += 1
+        mask = self._motion_mask(gate, frame)
+        moving = cv2.countNonZero(mask) > self.min_area_ratio * mask.size
+
+        if not moving:
+            if gate.keepalive_pending is not None:
+                return False, None # A keep-alive frame is already on its way to the detector
+            if gate.last_inference is not None and timestamp - gate.last_inference < self.keepalive_seconds:
+                return False, None
+            gate.keepalive_pending = timestamp
+            return True, None
+        return True, self._regions(mask, frame.shape) if self.regions else None
+
+    def mark_inferred(self, source, timestamp, regions=None):
+        """Records that the detector ran on the frame of `source` captured at `timestamp` (on `regions`)."""
+        gate = self.cameras.get(source)
+        if gate is None:
+            return
+        gate.inferred += 1
+        if regions:
+            gate.region_frames += 1
+        if gate.keepalive_pending is not None and timestamp >= gate.keepalive_pending:
+            if timestamp == gate.keepalive_pending:
+                gate.keepalive += 1
+            gate.keepalive_pending = None
+        if gate.last_inference is None or timestamp > gate.last_inference:
+            gate.last_inference = timestamp
+
+    def discard(self, source, timestamp):
+        """A frame `check` approved was dropped before inference: a pending keep-alive is re-armed."""
+        gate = self.cameras.get(source)
+        if gate is not None and gate.keepalive_pending == timestamp:
+            gate.keepalive_pending = None
+
+    def stats(self):
+        """Per camera: frames seen, inferred (of which keep-alive / region-only) and skipped."""
+        return {source: {'frames': gate.frames, 'inferred': gate.inferred, 'keepalive': gate.keepalive,
+                         'regions': gate.region_frames, 'skipped': gate.frames - gate.inferred,
+                         'skipped_ratio': round((gate.frames - gate.inferred) / gate.frames, 3) if gate.frames else 0.0}
+                for source, gate in self.cameras.items()}
+
+
+def carry_over(previous, regions):
+    """
+    Rows of `previous` detections lying entirely outside `regions`: objects that did not
+    move keep their last box when only the moving regions were inferred.
+    """
+    previous = np.asarray(previous, dtype=np.float32).reshape(-1, 6)
+    if not len(previous) or not regions:
+        return previous
+    rects = np.asarray(regions, dtype=np.float32)
+    overlaps = ((previous[:, None, 0] < rects[None, :, 2]) & (rects[None, :, 0] < previous[:, None, 2]) &
+                (previous[:, None, 1] < rects[None, :, 3]) & (rects[None, :, 1] < previous[:, None, 3]))
+    return previous[~overlaps.any(axis=1)]
@@ -0,0 +1,201 @@
+# ONNX Runtime CPU backend for YOLO detection models exported with
+# `yolo export model=yolov8n.pt format=onnx`.
+# Requires onnxruntime: pip install onnxruntime
+
+import ast
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+def letterbox(frame, canvas, pad_value=114):
+    """
+    Resizes `frame` into the preallocated `canvas` (H, W, 3) keeping aspect ratio.
+    Only the padding strips are repainted; the image itself is resized straight into
+    the canvas, so no intermediate array is allocated.
+    Returns (ratio, (pad_left, pad_top)) needed to map boxes back to the frame.
+    """
+    h, w = frame.shape[:2]
+    new_h, new_w = canvas.shape[:2]
+    ratio = min(new_h / h, new_w / w)
+    resized_w, resized_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_left = (new_w - resized_w) // 2
+    pad_top = (new_h - resized_h) // 2
+
+    canvas[:pad_top] = pad_value
+    canvas[pad_top + resized_h:] = pad_value
+    canvas[:, :pad_left] = pad_value
+    canvas[:, pad_left + resized_w:] = pad_value
+    cv2.resize(frame, (resized_w, resized_h), dst=canvas[pad_top:pad_top + resized_h, pad_left:pad_left + resized_w],
+               interpolation=cv2.INTER_LINEAR)
+    return ratio, (pad_left, pad_top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy NMS over xyxy `boxes`; IoU against all remaining boxes is computed in one vector op."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, class_ids, iou_threshold):
+    """Class-aware NMS: boxes of different classes are shifted apart so they never suppress each other."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Decoded boxes can extend past the image (negative coordinates), so shift by the full extent
+    offsets = class_ids.astype(boxes.dtype)[:, None] * (boxes.max() - boxes.min() + 1)
+    return nms(boxes + offsets, scores, iou_threshold)
+
+
+class OnnxYoloModel:
+    """
+    Runs an exported Ultralytics YOLO (v8/v11) ONNX model on CPU.
+    Input and output tensors are allocated once per batch size and bound through
+    IO binding, so steady-state inference does not allocate per frame.
+    `predict` returns one [x1, y1, x2, y2, conf, cls] array per frame, the same
+    contract as `results[0].boxes.data` from the ultralytics path.
+    """
+    def __init__(self, model_path, imgsz=640, num_threads=0, max_det=300):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is not installed. Install it with: pip install onnxruntime")
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            sess_options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=sess_options,
+                                                    providers=['CPUExecutionProvider'])
+        self.max_det = max_det
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+        # Exports are either static (1, 3, 640, 640) or dynamic ('batch', 3, 'height', 'width')
+        batch_dim, _, h, w = model_input.shape
+        self.static_batch = batch_dim if isinstance(batch_dim, int) else None
+        self.static_hw = isinstance(h, int) and isinstance(w, int)
+        self.input_hw = (h, w) if self.static_hw else (imgsz, imgsz)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        try:
+            self.names = ast.literal_eval(metadata['names']) # Written by the ultralytics exporter
+        except (KeyError, ValueError, SyntaxError):
+            self.names = {}
+
+        self._buffers = {} # (batch size, input size) -> (canvases, input, output, io_binding)
+        print(f"ONNX Runtime session ready: input {self.input_name} {model_input.shape}, "
+              f"providers: {self.session.get_providers()}")
+
+    def _get_buffers(self, batch_size, input_hw):
+        """Allocates (once) the letterbox canvases, input/output tensors and IO binding for a batch/input size."""
+        key = (batch_size, input_hw)
+        if key not in self._buffers:
+            h, w = input_hw
+            canvases = np.full((batch_size, h, w, 3), 114, dtype=np.uint8)
+            input_tensor = np.empty((batch_size, 3, h, w), dtype=np.float32)
+
+            # One dry run tells us the output layout, e.g. (B, 4 + num_classes, num_anchors)
+            output_shape = self.session.run([self.output_name], {self.input_name: input_tensor})[0].shape
+            output_tensor = np.empty(output_shape, dtype=np.float32)
+
+            binding = self.session.io_binding()
+            binding.bind_input(self.input_name, 'cpu', 0, np.float32, input_tensor.shape, input_tensor.ctypes.data)
+            binding.bind_output(self.output_name, 'cpu', 0, np.float32, output_tensor.shape, output_tensor.ctypes.data)
+            self._buffers[key] = (canvases, input_tensor, output_tensor, binding)
+        return self._buffers[key]
+
+    def predict(self, frames, conf=0.25, iou=0.45, classes=None, imgsz=None):
+        """
+        Runs the model on a list of BGR frames and returns a list of (N, 6) detection arrays.
+        `imgsz` only applies to exports with a dynamic input size.
+        """
+        chunk, input_hw = self.batch_key(len(frames), imgsz)
+
+        detections = []
+        for start in range(0, len(frames), chunk):
+            detections.extend(self._predict_chunk(frames[start:start + chunk], conf, iou, classes, input_hw))
+        return detections
+
+    def _predict_chunk(self, frames, conf, iou, classes, input_hw):
+        input_tensor, transforms = self.prepare(frames, input_hw)
+        return self.infer(input_tensor, [frame.shape[:2] for frame in frames], transforms, conf, iou, classes)
+
+    def batch_key(self, batch_size, imgsz=None):
+        """(batch size, input size) the model runs `batch_size` frames at; models with equal keys can share `prepare`."""
+        input_hw = (int(imgsz), int(imgsz)) if imgsz and not self.static_hw else self.input_hw
+        return (self.static_batch or batch_size, input_hw)
+
+    def prepare(self, frames, input_hw):
+        """
+        Letterboxes and normalises up to one batch of `frames` into this model's input tensor
+        of size `input_hw` (see `batch_key`). Returns (input tensor, letterbox transforms);
+        the tensor is overwritten by the next call.
+        """
+        canvases, input_tensor, _, _ = self._get_buffers(self.static_batch or len(frames), input_hw)
+
+        transforms = []
+        for i, frame in enumerate(frames):
+            transforms.append(letterbox(frame, canvases[i]))
+            # BGR HWC uint8 -> RGB CHW float32 in [0, 1], written straight into the bound input
+            np.multiply(canvases[i][..., ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=input_tensor[i], casting='unsafe')
+        return input_tensor, transforms
+
+    def infer(self, input_tensor, frame_hws, transforms, conf=0.25, iou=0.45, classes=None):
+        """
+        Runs the model on a tensor from `prepare` (this model's, or another model's with the
+        same `batch_key`, so several models share one preprocessing pass) and returns one
+        (N, 6) detection array per frame of size `frame_hws[i]`.
+        """
+        batch_size, _, h, w = input_tensor.shape
+        _, own_input, output_tensor, binding = self._get_buffers(batch_size, (h, w))
+        if input_tensor is not own_input:
+            binding.bind_input(self.input_name, 'cpu', 0, np.float32, input_tensor.shape, input_tensor.ctypes.data)
+        try:
+            self.session.run_with_iobinding(binding)
+        finally:
+            if input_tensor is not own_input:
+                binding.bind_input(self.input_name, 'cpu', 0, np.float32, own_input.shape, own_input.ctypes.data)
+
+        return [self._postprocess(output_tensor[i], frame_hw, ratio, pad, conf, iou, classes)
+                for i, (frame_hw, (ratio, pad)) in enumerate(zip(frame_hws, transforms))]
+
+    def _postprocess(self, output, frame_hw, ratio, pad, conf, iou, classes):
+        """Decodes one (4 + num_classes, num_anchors) prediction into [x1, y1, x2, y2, conf, cls] rows."""
+        class_scores = output[4:]
+        class_ids = class_scores.argmax(axis=0)
+        scores = class_scores[class_ids, np.arange(class_scores.shape[1])]
+
+        mask = scores > conf
+        if classes is not None:
+            mask &= np.isin(class_ids, classes)
+        if not mask.any():
+            return np.empty((0, 6), dtype=np.float32)
+
+        cx, cy, bw, bh = output[:4, mask]
+        boxes = np.stack((cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2), axis=1)
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        keep = batched_nms(boxes, scores, class_ids, iou)[:self.max_det]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo the letterbox: remove padding, rescale and clip to the original frame
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, frame_hw[1])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, frame_hw[0])
+
+        return np.concatenate((boxes, scores[:, None], class_ids[:, None].astype(np.float32)), axis=1).astype(np.float32)
@@ -0,0 +1,171 @@
+import collections
+import threading
+import time
+
+DROP_OLDEST = 'drop_oldest' # Live sources: keep the newest data, never stall the producer
+BLOCK = 'block' # Files / alerts: never lose data, slow the producer down instead
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages with a configurable drop policy.
+    Only items put with DROP_OLDEST are ever dropped: a queue shared by live and file
+    sources evicts the oldest live item to make room, never a file item, and a live item
+    that finds the queue full of file items is dropped itself.
+    """
+    def __init__(self, name, maxsize=4, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown drop policy '{policy}' for queue {name}")
+        self.name = name
+        self.policy = policy
+        self.maxsize = max(1, int(maxsize))
+        self.items = collections.deque() # (item, droppable)
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.listeners = [] # Conditions notified on every put (see SourceQueues)
+        self.on_drop = [] # Callbacks taking each dropped item
+        self.dropped = 0
+
+    def _drop_oldest(self):
+        """Removes the oldest droppable item; False if every queued item must be kept."""
+        for i, (item, droppable) in enumerate(self.items):
+            if droppable:
+                del self.items[i]
+                self._dropped(item)
+                return True
+        return False
+
+    def _dropped(self, item):
+        self.dropped += 1
+        for callback in self.on_drop:
+            callback(item)
+
+    def put(self, item, policy=None, stop_event=None):
+        """Adds `item`; `policy` overrides the queue default for this item (e.g. per source type)."""
+        policy = policy or self.policy
+        with self.lock:
+            if policy == BLOCK:
+                # Wait in short steps so a stopping pipeline does not hang on a full queue
+                while len(self.items) >= self.maxsize:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+                    self.not_full.wait(0.2)
+            elif len(self.items) >= self.maxsize and not self._drop_oldest():
+                self._dropped(item) # Only blocking items queued: they are kept, this one goes
+                return False
+            self.items.append((item, policy != BLOCK))
+            self.not_empty.notify()
+        for listener in self.listeners:
+            with listener:
+                listener.notify()
+        return True
+
+    def get(self, timeout=0.2):
+        """Returns the next item or None after `timeout` seconds."""
+        with self.lock:
+            if not self.items and not self.not_empty.wait(timeout):
+                return None
+            return self._pop()
+
+    def get_nowait(self):
+        with self.lock:
+            return self._pop()
+
+    def _pop(self):
+        if not self.items:
+            return None
+        item, _ = self.items.popleft()
+        self.not_full.notify()
+        return item
+
+    def qsize(self):
+        return len(self.items)
+
+
+class SourceQueues:
+    """
+    One StageQueue per source, read in turn: every source keeps its own capacity and drop
+    policy, and a busy source cannot crowd the others out of a batch.
+    Has the reading side of a StageQueue (get, get_nowait, qsize, dropped).
+    """
+    def __init__(self, queues):
+        self.queues = list(queues)
+        self.next = 0 # Queue to look at first on the next get
+        self.ready = threading.Condition()
+        for q in self.queues:
+            q.listeners.append(self.ready)
+
+    @property
+    def dropped(self):
+        return sum(q.dropped for q in self.queues)
+
+    def get_nowait(self):
+        for offset in range(len(self.queues)):
+            index = (self.next + offset) % len(self.queues)
+            item = self.queues[index].get_nowait()
+            if item is not None:
+                self.next = (index + 1) % len(self.queues)
+                return item
+        return None
+
+    def get(self, timeout=0.2):
+        """Returns the next item of the next non-empty queue, or None after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        with self.ready:
+            while True:
+                item = self.get_nowait()
+                remaining = deadline - time.monotonic()
+                if item is not None or remaining <= 0:
+                    return item
+                self.ready.wait(remaining)
+
+    def qsize(self):
+        return sum(q.qsize() for q in self.queues)
+
+
+class Stage(threading.Thread):
+    """
+    A pipeline stage running in its own thread: takes items from `input_queue`,
+    calls `process(item)` and forwards any non-None result to `output_queue`.
+    Subclasses override `process` (and optionally `run` for sources or batching).
+    A dict item may carry a 'drop_policy' that overrides the output queue default.
+    """
+    def __init__(self, name, stop_event, input_queue=None, output_queue=None):
+        super().__init__(name=name, daemon=True)
+        self.stop_event = stop_event
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.processed = 0
+        self.idle = True # False while an item is being processed
+        self.busy_time = 0.0 # Seconds spent in process(), for per-stage load reporting
+
+    def process(self, item):
+        raise NotImplementedError
+
+    def emit(self, item, policy=None):
+        if self.output_queue is not None and item is not None:
+            self.output_queue.put(item, policy=policy, stop_event=self.stop_event)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.idle = True
+            item = self.input_queue.get()
+            if item is None:
+                continue
+            self.idle = False
+            start_time = time.perf_counter()
+            try:
+                result = self.process(item)
+            except Exception as e:
+                print(f"Error in stage {self.name}: {e}")
+                continue
+            self.busy_time += time.perf_counter() - start_time
+            self.processed += 1
+            self.emit(result, policy=result.get('drop_policy') if isinstance(result, dict) else None)
+        print(f"Stage stopped: {self.name}")
+
+
+def pipeline_drained(stages, queues):
+    """True when every queue is empty and no stage is in the middle of an item."""
+    return all(q is None or q.qsize() == 0 for q in queues) and all(stage.idle for stage in stages)
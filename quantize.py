@@ -0,0 +1,273 @@
+"""
+Reduced-precision model variants for Raspberry Pi deployment.
+
+    python quantize.py lstm lstm_model.pth lstm_behavior_extended.pth   # -> *_int8.pt (dynamic int8)
+    python quantize.py detector models/yolov8n.pt --clip clip.mp4      # -> *_int8.onnx, *_fp16_ncnn_model
+    python quantize.py report --clip clip.mp4 --config config.yaml      # accuracy vs latency per variant
+
+The variants sit next to the original file; `detector_precision` and `behavior_precision`
+in config.yaml pick them at runtime (see model_variants.variant_path).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+import cv2
+import numpy as np
+from model_variants import PRECISIONS, variant_candidate
+
+
+# --- LSTM behaviour models ---
+
+def quantize_lstm(path, output_path=None):
+    """Dynamic int8 quantization of the LSTM and Linear layers, saved as TorchScript."""
+    import torch
+    from behavior_model import load_checkpoint, select_quantized_engine
+
+    engine = select_quantized_engine()
+    model = load_checkpoint(path)
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8)
+    output_path = output_path or variant_candidate(path, 'int8', 'lstm')
+    torch.jit.script(quantized).save(output_path)
+    print(f"Quantized {path} -> {output_path} (int8, {engine})")
+    return output_path
+
+
+# --- Detector ---
+
+class _ClipCalibrationReader:
+    """Feeds letterboxed frames of a clip to the ONNX Runtime int8 calibrator."""
+    def __init__(self, clip, input_name, imgsz, num_frames):
+        from onnx_backend import letterbox
+        self.inputs = []
+        canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        for frame in _clip_frames(clip, num_frames, spread=True):
+            letterbox(frame, canvas)
+            # Same preprocessing as OnnxYoloModel: RGB, CHW, [0, 1]
+            tensor = canvas[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            self.inputs.append({input_name: tensor})
+        if not self.inputs:
+            raise ValueError(f"No frames could be read from {clip} for calibration")
+        self.iterator = iter(self.inputs)
+
+    def get_next(self):
+        return next(self.iterator, None)
+
+
+def _detect_head_nodes(onnx_path):
+    """Nodes of the last '/model.N/' block (the Detect head); box decoding loses too much in int8."""
+    import onnx
+    names = [node.name for node in onnx.load(onnx_path).graph.node]
+    indices = [int(m.group(1)) for m in (re.match(r'/model\.(\d+)/', name) for name in names) if m]
+    if not indices:
+        return []
+    prefix = f"/model.{max(indices)}/"
+    return [name for name in names if name.startswith(prefix)]
+
+
+def export_detector(model_path, precisions=('int8', 'fp16'), clip=None, imgsz=640, calibration_frames=100):
+    """Exports an ultralytics .pt detector to int8 ONNX (calibrated on `clip`) and/or fp16 NCNN."""
+    from ultralytics import YOLO
+
+    outputs = {}
+    if 'int8' in precisions:
+        if not clip:
+            raise ValueError("int8 export needs --clip: activations are calibrated on real frames")
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+        import onnxruntime
+
+        onnx_path = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=False, simplify=True)
+        input_name = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        reader = _ClipCalibrationReader(clip, input_name, imgsz, calibration_frames)
+        output_path = variant_candidate(model_path, 'int8', 'detector')
+        quantize_static(onnx_path, output_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        nodes_to_exclude=_detect_head_nodes(onnx_path))
+        outputs['int8'] = output_path
+        print(f"Exported {model_path} -> {output_path} (int8, {len(reader.inputs)} calibration frames)")
+
+    if 'fp16' in precisions:
+        exported = YOLO(model_path).export(format='ncnn', imgsz=imgsz, half=True)
+        output_path = variant_candidate(model_path, 'fp16', 'detector')
+        if os.path.exists(output_path):
+            shutil.rmtree(output_path)
+        shutil.move(str(exported), output_path)
+        outputs['fp16'] = output_path
+        print(f"Exported {model_path} -> {output_path} (fp16 NCNN)")
+    return outputs
+
+
+# --- Comparison report ---
+
+def _clip_frames(clip, max_frames, spread=False):
+    """Yields up to `max_frames` frames of a clip; `spread` samples them across the whole clip."""
+    cap = cv2.VideoCapture(clip)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or max_frames
+    step = max(1, total // max_frames) if spread else 1
+    count = index = 0
+    while count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % step == 0:
+            count += 1
+            yield frame
+        index += 1
+    cap.release()
+
+
+def _box_iou(a, b):
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = (br - tl).clip(0).prod(axis=2)
+    area_a = (a[:, 2:4] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:4] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+def _matches(reference, detections, iou_threshold=0.5):
+    """Greedy same-class matches of `detections` against the reference model's boxes."""
+    reference = np.asarray(reference, dtype=np.float32).reshape(-1, 6)
+    detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+    if not len(reference) or not len(detections):
+        return 0
+    iou = _box_iou(reference, detections)
+    iou[reference[:, 5][:, None] != detections[:, 5][None, :]] = 0
+    matched = 0
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        iou[i, :] = 0
+        iou[:, j] = 0
+        matched += 1
+    return matched
+
+
+def _latency_summary(latencies):
+    latencies = np.asarray(latencies[3:] or latencies) # Skip warm-up calls
+    return {'mean_ms': float(latencies.mean()), 'p95_ms': float(np.percentile(latencies, 95))}
+
+
+def compare_detectors(config, clip, max_frames):
+    from detection import Detector
+
+    results = {}
+    reference = None
+    for precision in PRECISIONS:
+        model_path = config.get('detection_model_rgb')
+        if precision != 'fp32' and not os.path.exists(variant_candidate(model_path, precision, 'detector') or ''):
+            continue
+        variant_config = dict(config, processing=dict(config['processing'], detector_precision=precision))
+        detector = Detector(model_path, None, device='cpu', config=variant_config)
+        latencies, outputs = [], []
+        for frame in _clip_frames(clip, max_frames):
+            detections, latency = detector.predict(frame)
+            latencies.append(latency)
+            outputs.append(np.asarray(detections, dtype=np.float32).reshape(-1, 6))
+        if not outputs:
+            raise ValueError(f"No frames could be read from {clip}")
+        entry = _latency_summary(latencies)
+        entry['detections_per_frame'] = float(np.mean([len(o) for o in outputs]))
+        if reference is None:
+            reference = outputs
+        else:
+            matched = sum(_matches(r, o) for r, o in zip(reference, outputs))
+            entry['recall_vs_fp32'] = matched / max(1, sum(len(r) for r in reference))
+            entry['precision_vs_fp32'] = matched / max(1, sum(len(o) for o in outputs))
+        results[precision] = entry
+    return results, reference
+
+
+def compare_behavior_models(config, reference_detections):
+    """Feeds the fp32 detector's tracked box centers to every LSTM variant and compares the labels."""
+    from behavior_model import TrackBehaviorClassifier
+    from track_store import TrackStore
+    from tracking import Tracker
+
+    tracker = Tracker(config)
+    frames = []
+    for detections in reference_detections:
+        tracks = tracker.update(detections)
+        centers = np.stack(((tracks[:, 0] + tracks[:, 2]) / 2, (tracks[:, 1] + tracks[:, 3]) / 2), axis=1)
+        frames.append((tracks[:, 4].astype(np.int64), centers))
+
+    behavior = config['behavior_analysis']
+    model_path = behavior.get('behavior_model') or 'lstm_model.pth'
+    results = {}
+    reference = None
+    for precision in ('fp32', 'int8'):
+        if precision != 'fp32' and not os.path.exists(variant_candidate(model_path, precision, 'lstm') or ''):
+            continue
+        variant_config = dict(config, behavior_analysis=dict(behavior, behavior_model=model_path,
+                                                             behavior_precision=precision))
+        store = TrackStore({}, ttl_seconds=60)
+        classifier = TrackBehaviorClassifier(variant_config, max_tracks=store.max_tracks)
+        store.on_release.append(lambda track_id, slot: classifier.release(slot))
+        latencies, labels = [], []
+        for frame_index, (track_ids, centers) in enumerate(frames):
+            slots = store.slots_for(track_ids, float(frame_index))
+            start_time = time.perf_counter()
+            classified, index, _ = classifier.update(slots, centers[:, 0], centers[:, 1])
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            labels.append(dict(zip(store.track_ids[classified].tolist(), index.tolist())))
+        entry = _latency_summary(latencies)
+        if reference is None:
+            reference = labels
+        else:
+            pairs = [(label, ref[track_id]) for ref, out in zip(reference, labels)
+                     for track_id, label in out.items() if track_id in ref]
+            entry['label_agreement_vs_fp32'] = float(np.mean([a == b for a, b in pairs])) if pairs else None
+        results[precision] = entry
+    return results
+
+
+def report(config_path, clip, max_frames=300, output_path=None):
+    from config_loader import load_config
+
+    config = load_config(config_path)
+    detector_results, reference_detections = compare_detectors(config, clip, max_frames)
+    behavior_results = compare_behavior_models(config, reference_detections)
+    result = {'clip': clip, 'frames': len(reference_detections),
+              'detector': detector_results, 'behavior_model': behavior_results}
+
+    for name, variants in (('Detector', detector_results), ('Behaviour LSTM', behavior_results)):
+        print(f"\n{name} ({clip}, {len(reference_detections)} frames)")
+        for precision, entry in variants.items():
+            print(f"  {precision:5s} " + "  ".join(
+                f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in entry.items()))
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Report written to {output_path}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and compare reduced-precision model variants")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    lstm_parser = commands.add_parser('lstm', help="Dynamic int8 quantization of LSTM behaviour checkpoints")
+    lstm_parser.add_argument('checkpoints', nargs='+', help="e.g. lstm_model.pth lstm_behavior_extended.pth")
+
+    detector_parser = commands.add_parser('detector', help="int8 ONNX / fp16 NCNN export of a YOLO .pt model")
+    detector_parser.add_argument('model', help="e.g. models/yolov8n.pt")
+    detector_parser.add_argument('--precision', nargs='+', choices=['int8', 'fp16'], default=['int8', 'fp16'])
+    detector_parser.add_argument('--clip', default=None, help="Recorded clip for int8 calibration")
+    detector_parser.add_argument('--imgsz', type=int, default=640)
+    detector_parser.add_argument('--calibration-frames', type=int, default=100)
+
+    report_parser = commands.add_parser('report', help="Accuracy vs latency of every available variant on a clip")
+    report_parser.add_argument('--clip', required=True)
+    report_parser.add_argument('--config', default='config.yaml')
+    report_parser.add_argument('--frames', type=int, default=300)
+    report_parser.add_argument('--output', default=None, help="Also write the report as JSON")
+
+    args = parser.parse_args()
+    if args.command == 'lstm':
+        for checkpoint in args.checkpoints:
+            quantize_lstm(checkpoint)
+    elif args.command == 'detector':
+        export_detector(args.model, args.precision, args.clip, args.imgsz, args.calibration_frames)
+    else:
+        report(args.config, args.clip, args.frames, args.output)
@@ -0,0 +1,158 @@
+# Region-of-interest tiling for long, thin fence zones.
+#
+# Running the detector on the full frame downscales it to the model input size, so distant
+# people next to the fence end up a few pixels tall. RoiTiler instead cuts tiles of the
+# model input size, at native resolution, around the bounding boxes of the `fence_zones`
+# polygons. It runs all tiles of all frames in one batched call and maps the boxes back
+# to frame coordinates with cross-tile NMS.
+import math
+import time
+import numpy as np
+from onnx_backend import batched_nms
+
+
+def merge_rects(rects):
+    """Merges overlapping (x0, y0, x1, y1) rectangles until none overlap."""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def _window_starts(lo, hi, size, limit, overlap):
+    """Starts of `size`-long windows covering [lo, hi), kept inside [0, limit)."""
+    if hi - lo <= size:
+        return [min(max((lo + hi - size) // 2, 0), limit - size)] # One window centred on the range
+    stride = max(int(size * (1 - overlap)), 1)
+    count = math.ceil((hi - lo - size) / stride) + 1
+    return [min(max(int(round(s)), 0), limit - size) for s in np.linspace(lo, hi - size, count)]
+
+
+def fence_tiles(zones, frame_shape, tile_size=640, overlap=0.2, margin=32):
+    """
+    (x0, y0, x1, y1) tiles of `tile_size` pixels (smaller only if the frame is) covering the
+    bounding boxes of the `zones` polygons grown by `margin`; neighbouring tiles overlap by
+    `overlap` so an object cut by one tile border is whole in the next tile.
+    """
+    h, w = frame_shape[:2]
+    tile_w, tile_h = min(tile_size, w), min(tile_size, h)
+    rects = []
+    for zone in zones or []:
+        points = np.asarray(zone, dtype=np.int64).reshape(-1, 2)
+        x0, y0 = points.min(axis=0) - margin
+        x1, y1 = points.max(axis=0) + margin
+        x0, y0, x1, y1 = max(int(x0), 0), max(int(y0), 0), min(int(x1), w), min(int(y1), h)
+        if x0 < x1 and y0 < y1:
+            rects.append((x0, y0, x1, y1))
+
+    tiles = set()
+    for x0, y0, x1, y1 in merge_rects(rects):
+        for ty in _window_starts(y0, y1, tile_h, h, overlap):
+            for tx in _window_starts(x0, x1, tile_w, w, overlap):
+                tiles.add((tx, ty, tx + tile_w, ty + tile_h))
+    return sorted(tiles)
+
+
+class RoiTiler:
+    """
+    Detection on fence-zone tiles, with the same (detections, latency_ms) results as
+    Detector.predict_batch. `zones_by_source` maps a source name to its fence_zones;
+    sources without zones are run on the full frame.
+    With `include_full_frame` the downscaled full frame joins the batch as well, so objects
+    away from the fence are still detected (at the usual full-frame resolution).
+    """
+    def __init__(self, detector, zones_by_source, tile_size=640, overlap=0.2, margin=32,
+                 include_full_frame=True):
+        self.detector = detector
+        self.zones_by_source = zones_by_source
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.margin = margin
+        self.include_full_frame = include_full_frame
+        self._tiles = {} # (source, frame shape) -> tiles
+        self.frames = 0
+        self.tiles = 0
+
+    def tiles_for(self, source, frame_shape):
+        key = (source, frame_shape[:2])
+        if key not in self._tiles:
+            self._tiles[key] = fence_tiles(self.zones_by_source.get(source), frame_shape,
+                                           self.tile_size, self.overlap, self.margin)
+        return self._tiles[key]
+
+    def _merge(self, parts):
+        """Shifted per-crop detections of one frame -> (N, 6) rows after cross-tile NMS."""
+        rows = [np.asarray(detections, dtype=np.float32).reshape(-1, 6) + np.array((x0, y0, x0, y0, 0, 0), np.float32)
+                for (x0, y0), detections in parts]
+        rows = np.concatenate(rows) if rows else np.empty((0, 6), dtype=np.float32)
+        if len(parts) < 2 or not len(rows):
+            return rows
+        iou = self.detector.config['processing']['iou_threshold']
+        keep = batched_nms(rows[:, :4], rows[:, 4], rows[:, 5].astype(np.int64), iou)
+        return rows[keep]
+
+    def predict_batch(self, frames, is_thermal_flags=None, sources=None, imgsz=None, regions=None):
+        """
+        Runs the detector on the tiles (and full frames) of every frame at once, one batched
+        forward pass per model. A frame's latency is its share of the batch time.
+        `regions[i]`, when not None, replaces frame i's tiles (and full frame) with those
+        (x0, y0, x1, y1) crops, e.g. the moving regions found by the MotionGate.
+        """
+        if is_thermal_flags is None:
+            is_thermal_flags = [False] * len(frames)
+        if sources is None:
+            sources = [None] * len(frames)
+        if regions is None:
+            regions = [None] * len(frames)
+        outputs = [([], 0.0)] * len(frames)
+
+        for is_thermal in (False, True):
+            model = self.detector.model_thermal if is_thermal else self.detector.model_rgb
+            indices = [i for i, (frame, flag) in enumerate(zip(frames, is_thermal_flags))
+                       if bool(flag) == is_thermal and frame is not None]
+            if model is None or not indices:
+                continue
+
+            crops, owners = [], [] # owners[k] = (frame index, crop offset)
+            for i in indices:
+                frame = frames[i]
+                tiles = self.tiles_for(sources[i], frame.shape) if regions[i] is None else regions[i]
+                for x0, y0, x1, y1 in tiles:
+                    crops.append(frame[y0:y1, x0:x1]) # A view; the letterbox reads it in place
+                    owners.append((i, (x0, y0)))
+                if regions[i] is None and (self.include_full_frame or not tiles):
+                    crops.append(frame)
+                    owners.append((i, (0, 0)))
+                self.tiles += len(tiles)
+            self.frames += len(indices)
+
+            batch_latency = 0.0
+            try:
+                start_time = time.perf_counter()
+                crop_detections = self.detector._run_model(model, crops, imgsz)
+                batch_latency = (time.perf_counter() - start_time) * 1000 # Latency in ms
+            except Exception as e:
+                print(f"Error during ROI detection: {e}")
+                crop_detections = [[] for _ in crops]
+
+            parts = {i: [] for i in indices}
+            for (i, offset), detections in zip(owners, crop_detections):
+                parts[i].append((offset, detections))
+            per_frame_latency = batch_latency / len(indices)
+            for i in indices:
+                outputs[i] = (self._merge(parts[i]), per_frame_latency)
+        return outputs
+
+    def stats(self):
+        return {'frames': self.frames, 'tiles_per_frame': round(self.tiles / self.frames, 2) if self.frames else 0.0}
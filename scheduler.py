@@ -0,0 +1,115 @@
+import time
+from collections import deque
+
+
+def _imgsz_steps(base_imgsz, levels=3):
+    """Default inference sizes to fall back to: base, ~3/4 and ~1/2, rounded to the model stride (32)."""
+    steps = [int(base_imgsz)]
+    for factor in (0.75, 0.5)[:levels - 1]:
+        size = max(32, int(round(base_imgsz * factor / 32)) * 32)
+        if size < steps[-1]:
+            steps.append(size)
+    return steps
+
+
+class _SourceSchedule:
+    """Per-camera scheduling state."""
+    __slots__ = ('skip', 'counter', 'latency_ms', 'samples', 'processed_times')
+
+    def __init__(self, skip):
+        self.skip = skip # Process every 'skip + 1' frames
+        self.counter = 0
+        self.latency_ms = 0.0 # Exponential moving average of the measured latency
+        self.samples = 0 # Samples since the last adjustment
+        self.processed_times = deque(maxlen=120) # Timestamps of processed frames, for effective FPS
+
+
+class AdaptiveScheduler:
+    """
+    Decides which frames of each source go to Detector.predict, honouring `frame_skip`
+    and keeping the measured latency under `max_latency_ms`.
+    When a source runs over budget its skip rate is raised (up to `max_frame_skip`); if
+    that is not enough the shared inference size (`imgsz`) is lowered. With enough
+    headroom the changes are undone in reverse order: image size first, then skip rate.
+    """
+    def __init__(self, config):
+        processing = config['processing']
+        self.budget_ms = processing.get('max_latency_ms', 500)
+        self.base_skip = int(processing.get('frame_skip', 0) or 0)
+        self.enabled = processing.get('adaptive_scheduling', True)
+        self.max_skip = max(self.base_skip, int(processing.get('max_frame_skip', 5)))
+        self.headroom = processing.get('latency_headroom', 0.6) # Step back down below this share of the budget
+        self.adjust_every = processing.get('adjust_every_n_samples', 10)
+        self.imgsz_steps = processing.get('imgsz_steps') or _imgsz_steps(processing.get('imgsz', 640))
+        self.imgsz_level = 0
+        self.sources = {} # source name -> _SourceSchedule
+
+    @property
+    def imgsz(self):
+        """Inference size to pass to Detector.predict / predict_batch."""
+        return self.imgsz_steps[self.imgsz_level]
+
+    def _get(self, source_name):
+        if source_name not in self.sources:
+            self.sources[source_name] = _SourceSchedule(self.base_skip)
+        return self.sources[source_name]
+
+    def should_process(self, source_name):
+        """Call once per new frame of a source; returns True if this frame should be run through the detector."""
+        schedule = self._get(source_name)
+        process = schedule.counter % (schedule.skip + 1) == 0
+        schedule.counter += 1
+        return process
+
+    def record(self, source_name, latency_ms, capture_timestamp=None):
+        """
+        Records the latency of one processed frame. If `capture_timestamp` (from the
+        InputManager FramePacket) is given, the end-to-end lag since capture is used,
+        which also catches frames piling up in front of the detector.
+        """
+        schedule = self._get(source_name)
+        now = time.time()
+        if capture_timestamp:
+            latency_ms = max(latency_ms, (now - capture_timestamp) * 1000)
+        if schedule.latency_ms == 0.0:
+            schedule.latency_ms = latency_ms
+        else:
+            schedule.latency_ms = 0.8 * schedule.latency_ms + 0.2 * latency_ms
+        schedule.processed_times.append(now)
+        schedule.samples += 1
+
+        if self.enabled and schedule.samples >= self.adjust_every:
+            schedule.samples = 0
+            self._adjust(source_name, schedule)
+
+    def _adjust(self, source_name, schedule):
+        if schedule.latency_ms > self.budget_ms:
+            if schedule.skip < self.max_skip:
+                schedule.skip += 1
+                print(f"Scheduler: {source_name} over budget ({schedule.latency_ms:.0f} ms), processing every {schedule.skip + 1} frames")
+            elif self.imgsz_level < len(self.imgsz_steps) - 1:
+                self.imgsz_level += 1
+                print(f"Scheduler: {source_name} still over budget, lowering imgsz to {self.imgsz}")
+        elif schedule.latency_ms < self.budget_ms * self.headroom:
+            if self.imgsz_level > 0 and all(s.latency_ms < self.budget_ms * self.headroom for s in self.sources.values()):
+                self.imgsz_level -= 1 # imgsz is shared, so only raise it when every source has headroom
+                print(f"Scheduler: headroom available, raising imgsz to {self.imgsz}")
+            elif schedule.skip > self.base_skip:
+                schedule.skip -= 1
+                print(f"Scheduler: {source_name} has headroom, processing every {schedule.skip + 1} frames")
+
+    def effective_fps(self, source_name):
+        """Frames per second actually processed for a source over its recent history."""
+        times = self._get(source_name).processed_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def stats(self):
+        """Returns {source name: {'frame_skip', 'latency_ms', 'effective_fps'}} plus the current 'imgsz'."""
+        stats = {name: {'frame_skip': s.skip,
+                        'latency_ms': round(s.latency_ms, 1),
+                        'effective_fps': round(self.effective_fps(name), 1)}
+                 for name, s in self.sources.items()}
+        stats['imgsz'] = self.imgsz
+        return stats
@@ -1,126 +1,159 @@
-# Placeholder for SAM integration
+# SAM (Segment Anything) masks for detected objects.
 # Requires installing 'segment-anything' from Meta AI: pip install git+https://github.com/facebookresearch/segment-anything.git
-# And downloading model checkpoints.
+# And downloading a model checkpoint, e.g. sam_vit_b_01ec64.pth for model_type 'vit_b'.
 
-# from segment_anything import SamPredictor, sam_model_registry
 import time
 import cv2
 import numpy as np
 
+try:
+    import torch
+    from segment_anything import SamPredictor, sam_model_registry
+except ImportError:
+    torch = None
+    SamPredictor = sam_model_registry = None
+
+
+class _EmbeddingCache:
+    """A camera's last SAM image embedding and the thumbnail of the frame it was computed on."""
+    __slots__ = ('thumbnail', 'features', 'original_size', 'input_size', 'age')
+
+    def __init__(self, thumbnail, features, original_size, input_size):
+        self.thumbnail = thumbnail
+        self.features = features
+        self.original_size = original_size
+        self.input_size = input_size
+        self.age = 0 # Frames it has been reused for
+
+
 class Segmenter:
-    def __init__(self, model_path, model_type="vit_b", device='cpu'):
+    """
+    Masks for detection boxes with SAM. The ViT image encoder dominates the cost, so each
+    frame is encoded once and all of its boxes are prompted in a single batch. For static
+    cameras the embedding is also reused across frames while the scene has changed by less
+    than `cache_max_delta` (mean absolute grey-level difference on a small thumbnail of
+    the frame the embedding came from), for at most `cache_max_age` frames.
+    """
+    THUMBNAIL_SIZE = (64, 48)
+
+    def __init__(self, model_path, model_type="vit_b", device='cpu', cache_max_delta=2.0, cache_max_age=15):
         self.model_path = model_path
         self.model_type = model_type # e.g., 'vit_b', 'vit_l', 'vit_h'
-        self.device = device
+        self.device = f"cuda:{device}" if isinstance(device, int) else device # config.yaml gives a GPU index or 'cpu'
+        self.cache_max_delta = cache_max_delta
+        self.cache_max_age = cache_max_age
         self.predictor = None
-        # self._load_model() # Load model on init
-
-        print("Segmenter initialized (basic placeholder). SAM integration needed.")
-        print("Ensure 'segment-anything' is installed and model checkpoint is downloaded.")
+        self.caches = {} # source -> _EmbeddingCache
+        self._thumbnail = np.empty(self.THUMBNAIL_SIZE[::-1], dtype=np.uint8)
+        self._gray = None
+        self.encoded = 0
+        self.reused = 0
+        self._load_model() # Load model on init
 
 
     def _load_model(self):
-        # --- Requires SAM installation ---
-        # try:
-        #     print(f"Loading SAM model: {self.model_path} ({self.model_type})")
-        #     sam = sam_model_registry[self.model_type](checkpoint=self.model_path)
-        #     sam.to(device=self.device)
-        #     self.predictor = SamPredictor(sam)
-        #     print("SAM model loaded successfully.")
-        # except ImportError:
-        #     print("Error: 'segment-anything' library not found. Please install it.")
-        #     self.predictor = None
-        # except Exception as e:
-        #     print(f"Error loading SAM model: {e}")
-        #     self.predictor = None
-        pass # Placeholder implementation
-
-
-    def segment_objects(self, frame, boxes):
+        if sam_model_registry is None:
+            print("Error: 'segment-anything' (and torch) not found. Please install it. Segmentation disabled.")
+            return
+        try:
+            print(f"Loading SAM model: {self.model_path} ({self.model_type})")
+            sam = sam_model_registry[self.model_type](checkpoint=self.model_path)
+            sam.to(device=self.device)
+            sam.eval()
+            self.predictor = SamPredictor(sam)
+            print("SAM model loaded successfully.")
+        except Exception as e:
+            print(f"Error loading SAM model: {e}")
+            self.predictor = None
+
+    def _thumbnail_of(self, frame):
+        """Small grey copy of `frame` used to measure how much the scene changed (written into a reused buffer)."""
+        if frame.ndim == 3:
+            if self._gray is None or self._gray.shape != frame.shape[:2]:
+                self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            frame = self._gray
+        cv2.resize(frame, self.THUMBNAIL_SIZE, dst=self._thumbnail, interpolation=cv2.INTER_AREA)
+        return self._thumbnail
+
+    def _set_image(self, frame, source):
+        """Encodes `frame`, or restores the cached embedding of `source` when the scene barely changed."""
+        thumbnail = self._thumbnail_of(frame)
+        cache = self.caches.get(source) if source is not None else None
+        if (cache is not None and cache.original_size == frame.shape[:2] and cache.age < self.cache_max_age
+                and cv2.absdiff(thumbnail, cache.thumbnail).mean() <= self.cache_max_delta):
+            predictor = self.predictor
+            predictor.reset_image()
+            predictor.features = cache.features
+            predictor.original_size = cache.original_size
+            predictor.input_size = cache.input_size
+            predictor.is_image_set = True
+            cache.age += 1
+            self.reused += 1
+            return
+
+        self.predictor.set_image(frame, image_format='BGR') # Converted to the model's RGB internally
+        self.encoded += 1
+        if source is not None:
+            self.caches[source] = _EmbeddingCache(thumbnail.copy(), self.predictor.features,
+                                                  self.predictor.original_size, self.predictor.input_size)
+
+    def segment_objects(self, frame, boxes, source=None):
         """
         Segments objects within the given bounding boxes using SAM.
-        `boxes` should be in [x1, y1, x2, y2] format.
-        Returns masks and latency.
+        `boxes` should be in [x1, y1, x2, y2] format. `source` (camera name) enables
+        reusing the image embedding across that camera's frames.
+        Returns an (N, H, W) bool mask array and the latency in ms.
         """
         if self.predictor is None:
-            # print("Warning: SAM predictor not loaded. Skipping segmentation.")
             return None, 0.0 # Indicate segmentation was skipped
 
-        masks = []
         total_latency = 0.0
 
         try:
             start_time = time.perf_counter()
 
-            # --- SAM Workflow ---
-            # 1. Set the image for the predictor (needs to be done once per frame)
-            # self.predictor.set_image(frame) # frame should be RGB
-
-            # 2. For each bounding box, predict masks
-            # input_boxes = torch.tensor(boxes[:, :4], device=self.predictor.device) # Use detected boxes as prompts
-
-            # masks_batch, scores_batch, logits_batch = self.predictor.predict_torch(
-            #     point_coords=None,
-            #     point_labels=None,
-            #     boxes=input_boxes,
-            #     multimask_output=False, # Usually get one good mask per box
-            # )
-            # masks = masks_batch.cpu().numpy() # Get masks as numpy arrays
-
-            # --- Placeholder ---
-            print("Info: SAM segmentation logic not fully implemented.")
-            # Create dummy masks for testing structure
-            dummy_masks = []
-            for _ in boxes:
-                # Create a blank mask matching frame size (or a smaller RoI mask)
-                h, w = frame.shape[:2]
-                mask = np.zeros((h, w), dtype=bool) # Example empty mask
-                # In reality, SAM returns masks, often [1, H, W] or [N, H, W]
-                dummy_masks.append(mask)
-            masks = np.array(dummy_masks) if dummy_masks else None
-            # --- End Placeholder ---
+            # 1. Image embedding: once per frame, or reused for a static scene
+            self._set_image(frame, source)
 
+            # 2. Every box as a prompt in one batch
+            input_boxes = torch.as_tensor(np.asarray(boxes, dtype=np.float32)[:, :4], device=self.predictor.device)
+            input_boxes = self.predictor.transform.apply_boxes_torch(input_boxes, self.predictor.original_size)
+            masks_batch, _, _ = self.predictor.predict_torch(
+                point_coords=None,
+                point_labels=None,
+                boxes=input_boxes,
+                multimask_output=False, # One mask per box
+            )
+            masks = masks_batch[:, 0].cpu().numpy() # (N, H, W) bool, one transfer for the batch
 
             end_time = time.perf_counter()
             total_latency = (end_time - start_time) * 1000
-
-            # Reset image after processing all boxes for the frame (optional, good practice)
-            # self.predictor.reset_image()
-
             return masks, total_latency
 
         except Exception as e:
             print(f"Error during segmentation: {e}")
             return None, total_latency
 
+    def stats(self):
+        return {'encoded': self.encoded, 'reused': self.reused}
+
 
     def draw_masks(self, frame, masks, boxes, color=(0, 255, 255)):
         """Draws segmentation masks onto the frame."""
         if masks is None or len(masks) != len(boxes):
             return frame
+        masks = np.asarray(masks, dtype=bool)
+        if masks.ndim == 4:
+            masks = masks[:, 0] # [N, 1, H, W] -> [N, H, W]
+        if masks.shape[1:] != frame.shape[:2]:
+            print(f"Warning: Mask shape {masks.shape[1:]} differs from frame shape {frame.shape[:2]}. Skipping draw.")
+            return frame
 
-        overlay = frame.copy()
         alpha = 0.4 # Transparency
-
-        for i, mask in enumerate(masks):
-             if mask is None or not mask.any(): continue # Skip empty masks
-             # Ensure mask is boolean
-             mask_bool = mask.astype(bool)
-             # Ensure mask has same spatial dimensions as frame (H, W)
-             # SAM might return masks of shape [1, H, W] or [H, W], adjust as needed
-             if mask_bool.ndim == 3:
-                 mask_bool = mask_bool.squeeze(0) # Remove leading dimension if present
-
-             if mask_bool.shape != frame.shape[:2]:
-                  print(f"Warning: Mask shape {mask_bool.shape} differs from frame shape {frame.shape[:2]}. Skipping draw.")
-                  # Optional: Resize mask? Risky if aspect ratio is wrong.
-                  # mask_bool = cv2.resize(mask_bool.astype(np.uint8), (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_NEAREST).astype(bool)
-                  continue
-
-
-             # Apply color to the mask area
-             overlay[mask_bool] = color
-
-        # Blend the overlay with the original frame
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-        return frame
\ No newline at end of file
+        # Blend only the masked pixels instead of a full-frame overlay
+        mask = masks.any(axis=0)
+        if mask.any():
+            pixels = frame[mask].astype(np.float32)
+            frame[mask] = (pixels * (1 - alpha) + np.asarray(color, dtype=np.float32) * alpha).astype(np.uint8)
+        return frame
@@ -0,0 +1,33 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from input_manager import FrameRing
+
+
+def _publish(ring, value):
+    slot = ring.next_slot()
+    frame = np.full((2, 2), value, dtype=np.uint8) if slot is None else slot
+    frame[:] = value
+    ring.publish(frame)
+
+
+def test_get_rejects_the_slot_being_written():
+    ring = FrameRing(num_slots=4)
+    for value in range(6):
+        _publish(ring, value)
+    # Frame 2 shares its slot with frame 6, which the writer fills next
+    assert np.shares_memory(ring.next_slot(), ring.slots[2 % ring.num_slots])
+    assert ring.get(ring.seq - ring.num_slots) == (None, -1, 0.0)
+    view, index, _ = ring.get(ring.seq - ring.num_slots + 1)
+    assert index == 3 and view[0, 0] == 3 and not view.flags.writeable
+
+
+def test_get_newest_and_future_frames():
+    ring = FrameRing(num_slots=2)
+    assert ring.latest() == (None, -1, 0.0)
+    _publish(ring, 7)
+    view, index, _ = ring.latest()
+    assert index == 0 and view[0, 0] == 7
+    assert ring.get(1) == (None, -1, 0.0)
@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from heatmap_store import HeatmapStore
+
+IST = 5 * 3600 + 1800
+BOX = np.array([[0, 0, 10, 10]], dtype=np.float32) # Foot point in cell (1, 0) of a 4 x 4 grid on 40 x 40
+EMPTY = np.zeros((0, 4), dtype=np.float32)
+
+
+def _local_time(hour):
+    """Epoch seconds of `hour`:00 local time (IST) on some day."""
+    midnight = 1_700_000_000 // 86400 * 86400 - IST
+    return midnight + hour * 3600
+
+
+def test_restart_mid_hour_keeps_earlier_frames(tmp_path):
+    t0 = _local_time(20)
+    store = HeatmapStore(str(tmp_path), 'cam', (4, 4), utc_offset=IST)
+    for t in range(t0, t0 + 1800):
+        store.record(BOX, (40, 40), t)
+        if t == t0 + 900:
+            store.query(t0, t0 + 900) # Flushes partial hour and day buckets that go stale
+    # Crash: the open minute (20:29) is lost, the stored hour and day buckets stop at 20:15
+    store = HeatmapStore(str(tmp_path), 'cam', (4, 4))
+    assert store.utc_offset == IST
+    for t in range(t0 + 1800, t0 + 2700):
+        store.record(EMPTY, (40, 40), t)
+    store.flush()
+
+    minute, hour, day = store.levels
+    minutes = [minute.bucket(t) for t in range(t0, t0 + 2700, 60)]
+    frames = sum(b[1] for b in minutes if b is not None)
+    assert frames == 1740 + 900
+    hour_rates, hour_frames = hour.bucket(t0)
+    day_rates, day_frames = day.bucket(t0 - 20 * 3600)
+    assert hour_frames == day_frames == frames
+    assert abs(hour_rates[1, 0] - 1740 / frames) < 1e-3
+    assert abs(day_rates[1, 0] - 1740 / frames) < 1e-3
+
+
+def test_hours_filter_uses_local_hours(tmp_path):
+    t0 = _local_time(20)
+    store = HeatmapStore(str(tmp_path), 'cam', (4, 4), utc_offset=IST)
+    for t in range(t0 - 3600, t0 + 3600, 10):
+        store.record(BOX if t >= t0 else EMPTY, (40, 40), t)
+    grid, frames = store.query(t0 - 3600, t0 + 3600, hours={20})
+    assert frames == 360 and grid[1, 0] == 1.0
+    grid, frames = store.query(t0 - 3600, t0 + 3600, hours={19})
+    assert frames == 360 and grid[1, 0] == 0.0
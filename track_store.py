@@ -0,0 +1,129 @@
+import heapq
+import numpy as np
+
+
+class TrackStore:
+    """
+    Fixed-capacity per-track state, stored as one preallocated array per field
+    (struct of arrays) and addressed by slot; `slot_of` maps track id -> slot.
+
+    Tracks not seen for `ttl_seconds` expire. Every live track has exactly one entry
+    in a heap ordered by last-seen time; an entry that turns out to be stale (the track
+    was seen again since) is pushed back with the newer time, so expiry costs
+    O(log n) per expired or rescheduled track instead of a scan over all tracks.
+    When all `max_tracks` slots are taken, the least recently seen track is evicted.
+    """
+    def __init__(self, fields, ttl_seconds=60.0, max_tracks=4096):
+        """`fields` maps a field name to (dtype, default), e.g. {'first_seen': (np.float64, 0.0)}."""
+        self.ttl_seconds = ttl_seconds
+        self.max_tracks = int(max_tracks)
+        self.fields = dict(fields)
+        for name, (dtype, default) in self.fields.items():
+            setattr(self, name, np.full(self.max_tracks, default, dtype=dtype))
+
+        self.track_ids = np.full(self.max_tracks, -1, dtype=np.int64) # -1 marks a free slot
+        self.last_seen = np.zeros(self.max_tracks, dtype=np.float64)
+        self.generation = np.zeros(self.max_tracks, dtype=np.int64) # Bumped whenever a slot is released
+        self.slot_of = {}
+        self.free_slots = list(range(self.max_tracks - 1, -1, -1))
+        self.heap = [] # (last_seen when pushed, slot, generation)
+        self.on_release = [] # Callbacks (track_id, slot) run when a track expires or is evicted
+
+        self.created_count = 0
+        self.expired_count = 0
+        self.evicted_count = 0
+        self.rejected_count = 0 # Tracks that got no slot because every slot was in use this frame
+
+    def slots_for(self, track_ids, current_time):
+        """
+        Returns the slot of every track id (allocating slots for new tracks, with all
+        fields reset to their defaults) and marks them as seen at `current_time`.
+        A slot is -1 if the store is full of tracks that were all seen at `current_time`.
+        """
+        slots = np.empty(len(track_ids), dtype=np.int64)
+        for i, track_id in enumerate(np.asarray(track_ids, dtype=np.int64).tolist()):
+            slot = self.slot_of.get(track_id)
+            if slot is None:
+                slot = self._allocate(track_id, current_time)
+            else:
+                self.last_seen[slot] = current_time # Before any allocation below can evict it
+            slots[i] = slot
+        return slots
+
+    def _allocate(self, track_id, current_time):
+        if not self.free_slots and not self._evict_least_recent(current_time):
+            self.rejected_count += 1
+            return -1
+        slot = self.free_slots.pop()
+        for name, (_, default) in self.fields.items():
+            getattr(self, name)[slot] = default
+        self.track_ids[slot] = track_id
+        self.last_seen[slot] = current_time
+        self.slot_of[track_id] = slot
+        heapq.heappush(self.heap, (current_time, slot, int(self.generation[slot])))
+        self.created_count += 1
+        return slot
+
+    def _pop_oldest(self):
+        """Pops heap entries until one is current; returns its slot (or None if the heap is empty)."""
+        while self.heap:
+            seen, slot, generation = heapq.heappop(self.heap)
+            if generation != self.generation[slot]:
+                continue # Slot was released and reused since this entry was pushed
+            if self.last_seen[slot] > seen:
+                heapq.heappush(self.heap, (self.last_seen[slot], slot, generation)) # Seen again: reschedule
+                continue
+            return slot
+        return None
+
+    def _evict_least_recent(self, current_time):
+        self.expire(current_time)
+        if self.free_slots:
+            return True
+        slot = self._pop_oldest()
+        if slot is None:
+            return False
+        if self.last_seen[slot] >= current_time:
+            # Everything was seen this frame; evicting would corrupt the slots handed out already
+            heapq.heappush(self.heap, (self.last_seen[slot], slot, int(self.generation[slot])))
+            return False
+        self._release(slot)
+        self.evicted_count += 1
+        return True
+
+    def expire(self, current_time):
+        """Releases every track not seen within `ttl_seconds`."""
+        cutoff = current_time - self.ttl_seconds
+        while self.heap and self.heap[0][0] < cutoff:
+            slot = self._pop_oldest()
+            if slot is None:
+                break
+            if self.last_seen[slot] >= cutoff:
+                # Rescheduled entry that is still alive; put it back and stop
+                heapq.heappush(self.heap, (self.last_seen[slot], slot, int(self.generation[slot])))
+                break
+            self._release(slot)
+            self.expired_count += 1
+
+    def _release(self, slot):
+        track_id = int(self.track_ids[slot])
+        for callback in self.on_release:
+            callback(track_id, slot)
+        del self.slot_of[track_id]
+        self.track_ids[slot] = -1
+        self.generation[slot] += 1
+        self.free_slots.append(slot)
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def stats(self):
+        """Track lifecycle metrics."""
+        return {
+            'live': len(self.slot_of),
+            'capacity': self.max_tracks,
+            'created': self.created_count,
+            'expired': self.expired_count,
+            'evicted': self.evicted_count,
+            'rejected': self.rejected_count,
+        }
@@ -0,0 +1,70 @@
+# Multi-object tracking on top of Detector output, using the ByteTrack / BoT-SORT
+# implementations that ship with ultralytics.
+import os
+import numpy as np
+
+try:
+    from ultralytics.trackers import BOTSORT, BYTETracker
+except ImportError:
+    BOTSORT = BYTETracker = None
+
+try:
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+except ImportError:
+    try: # ultralytics 8.0.x layout
+        from ultralytics.yolo.utils import IterableSimpleNamespace, yaml_load
+        from ultralytics.yolo.utils.checks import check_yaml
+    except ImportError: # No ultralytics: Tracker() raises a clear ImportError instead
+        IterableSimpleNamespace = yaml_load = check_yaml = None
+
+
+class _DetectionResults:
+    """Minimal stand-in for ultralytics `Boxes`, built from a [x1, y1, x2, y2, conf, cls] array."""
+    def __init__(self, detections):
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        self.xyxy = detections[:, :4]
+        self.conf = detections[:, 4]
+        self.cls = detections[:, 5]
+        self.xywh = np.empty_like(self.xyxy)
+        self.xywh[:, :2] = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        self.xywh[:, 2:] = self.xyxy[:, 2:] - self.xyxy[:, :2]
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, index):
+        sliced = _DetectionResults(np.empty((0, 6), dtype=np.float32))
+        sliced.xyxy, sliced.xywh = self.xyxy[index], self.xywh[index]
+        sliced.conf, sliced.cls = self.conf[index], self.cls[index]
+        return sliced
+
+
+class Tracker:
+    """
+    Tracks detections of one video source.
+    `update` returns an (N, 7) array [x1, y1, x2, y2, track_id, conf, cls], the track
+    format BehaviorAnalyzer expects.
+    """
+    def __init__(self, config, frame_rate=30):
+        tracking = config.get('tracking', {})
+        tracker_type = tracking.get('tracker_type', 'bytetrack')
+        tracker_config = tracking.get('tracker_config', f"{tracker_type}.yaml")
+
+        if BYTETracker is None:
+            raise ImportError("ultralytics trackers not available. Install ultralytics to enable tracking.")
+        # Fall back to the copy bundled with ultralytics if the configured path does not exist
+        if not os.path.exists(tracker_config):
+            tracker_config = check_yaml(os.path.basename(tracker_config))
+        args = IterableSimpleNamespace(**yaml_load(tracker_config))
+
+        tracker_class = BOTSORT if tracker_type == 'botsort' else BYTETracker
+        self.tracker = tracker_class(args=args, frame_rate=frame_rate)
+        print(f"Tracker initialized: {tracker_type} ({tracker_config})")
+
+    def update(self, detections, frame=None):
+        """Advances the tracker by one frame of detections."""
+        tracks = self.tracker.update(_DetectionResults(detections), frame)
+        if len(tracks) == 0:
+            return np.empty((0, 7), dtype=np.float32)
+        return np.asarray(tracks, dtype=np.float32)[:, :7] # Drop the trailing detection index
@@ -4,6 +4,8 @@ import pandas as pd
 from ultralytics import YOLO
 import cvzone
 import numpy as np
+import time
+from scheduler import AdaptiveScheduler
 picam2 = Picamera2()
 picam2.preview_configuration.main.size = (640,480)
 picam2.preview_configuration.main.format = "RGB888"
@@ -19,21 +21,23 @@ model = YOLO("yolo11n.pt")
 
 # Open the video file (use video file or webcam, here using webcam)
 cap = cv2.VideoCapture(0)
-count=0
+# Frame skipping adapts to the measured latency instead of a fixed 'count % 3'
+scheduler = AdaptiveScheduler({'processing': {'frame_skip': 2, 'max_latency_ms': 500, 'imgsz': 240}})
 
 
 while True:
     frame= picam2.capture_array()
     
-    count += 1
-    if count % 3 != 0:
+    if not scheduler.should_process('picam'):
         continue
     frame=cv2.flip(frame,-1)
 
 #    frame = cv2.resize(frame, (1020, 500))
     
     # Run YOLOv8 tracking on the frame, persisting tracks between frames
-    results = model.track(frame, persist=True,imgsz=240)
+    start_time = time.perf_counter()
+    results = model.track(frame, persist=True,imgsz=scheduler.imgsz)
+    scheduler.record('picam', (time.perf_counter() - start_time) * 1000)
 
     # Check if there are any boxes in the results
     if results[0].boxes is not None and results[0].boxes.id is not None:
@@ -50,6 +54,7 @@ while True:
             cvzone.putTextRect(frame,f'{track_id}',(x1,y2),1,1)
             cvzone.putTextRect(frame,f'{c}',(x1,y1),1,1)
 
+    cv2.putText(frame, f"{scheduler.effective_fps('picam'):.1f} FPS", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
     cv2.imshow("RGB", frame)
     if cv2.waitKey(1) & 0xFF == ord("q"):
        break